@@ -0,0 +1,99 @@
+"""
+Token authentication which caches token -> user lookups.
+
+TokenAuthentication queries Token joined to User on every request. Here the
+result is kept in a bounded in-process LRU cache and, when
+TOKEN_AUTH_CACHE['SHARED_CACHE'] names a cache in CACHES, in that shared
+cache too. The signals in authentication.signals evict a token when it is
+deleted or its user changes. Other processes only see such a change once
+their local entry expires after TOKEN_AUTH_CACHE['LOCAL_TTL'] seconds.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+KEY_PREFIX = 'auth-token:'
+
+
+class LRUCache:
+    """
+    A thread-safe LRU cache of at most `max_size` entries, each expiring
+    `ttl` seconds after it was set.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LRUCache(settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+                       settings.TOKEN_AUTH_CACHE['LOCAL_TTL'])
+
+
+def get_shared_cache():
+    alias = settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def evict(key):
+    """
+    Removes a token from the local and shared caches.
+    """
+    local_cache.delete(key)
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete(KEY_PREFIX + key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        credentials = local_cache.get(key)
+        shared_cache = get_shared_cache()
+        if credentials is None and shared_cache is not None:
+            credentials = shared_cache.get(KEY_PREFIX + key)
+            if credentials is not None:
+                local_cache.set(key, credentials)
+        if credentials is None:
+            # Raises AuthenticationFailed for unknown tokens and inactive users
+            credentials = super().authenticate_credentials(key)
+            local_cache.set(key, credentials)
+            if shared_cache is not None:
+                shared_cache.set(KEY_PREFIX + key, credentials,
+                                 settings.TOKEN_AUTH_CACHE['SHARED_TTL'])
+        user, token = credentials
+        # Requests must not share a mutable user instance
+        return copy.copy(user), token
@@ -0,0 +1,83 @@
+"""
+The colleges users can choose from, read from college_list.json.
+
+The list is only loaded the first time it is needed, rather than when
+authentication.models is imported by every process, and is kept in memory
+afterwards. Membership is checked against a set, and searches match the
+start of the name or of any of its words, falling back to close matches for
+misspelt queries.
+"""
+import json
+import os
+import re
+from bisect import bisect_left
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+
+COLLEGE_LIST_PATH = os.path.join(os.path.dirname(__file__), 'college_list.json')
+
+
+def normalize(text):
+    """
+    Lower-cased words of `text` without punctuation, joined by single spaces.
+    """
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+class CollegeIndex:
+
+    def __init__(self, names):
+        self.names = names
+        self.name_set = frozenset(names)
+        self.normalized = [normalize(name) for name in names]
+        # (word, position in names) of every word, sorted for prefix lookups
+        self.words = sorted((word, position)
+                            for position, name in enumerate(self.normalized)
+                            for word in set(name.split()))
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def _word_prefix(self, prefix):
+        """
+        Positions of the names with a word starting with `prefix`.
+        """
+        positions = set()
+        for word, position in self.words[bisect_left(self.words, (prefix,)):]:
+            if not word.startswith(prefix):
+                break
+            positions.add(position)
+        return positions
+
+    def search(self, query, limit=20):
+        """
+        Names matching `query`, best matches first: names starting with the
+        query, then names with words starting with every word of the query,
+        then close matches if there is no other match.
+        """
+        query = normalize(query)
+        if not query:
+            return self.names[:limit]
+        words = query.split()
+        positions = self._word_prefix(words[0])
+        for word in words[1:]:
+            positions &= self._word_prefix(word)
+        matches = sorted(positions, key=lambda position: (
+            not self.normalized[position].startswith(query), position))
+        if not matches:
+            import difflib
+            close = difflib.get_close_matches(query, self.normalized, limit, 0.6)
+            matches = [self.normalized.index(name) for name in dict.fromkeys(close)]
+        return [self.names[position] for position in matches[:limit]]
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    with open(COLLEGE_LIST_PATH) as college_file:
+        return CollegeIndex([college['name'] for college in json.load(college_file)])
+
+
+def validate_college(value):
+    if value not in get_index():
+        raise ValidationError('%(value)s is not a known college.',
+                              code='invalid_choice', params={'value': value})
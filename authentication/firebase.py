@@ -0,0 +1,281 @@
+"""
+Lazy initialization of the Firebase Admin SDK and local verification of
+Firebase ID tokens.
+
+The service account credentials are decrypted in memory and the SDK is
+initialized the first time it is needed, not when the settings are loaded.
+
+ID tokens are RS256 JWTs signed with Google's rotating keys. The public keys
+are fetched from a pluggable key source (settings.FIREBASE_KEY_SOURCE) and
+kept in memory for the max-age announced by the source; they are refreshed
+in a background thread shortly before they expire, so logins only wait for
+a fetch on a cold start or when a token names an unknown key. If a refresh
+fails, the expired keys are still used for a grace period.
+"""
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import jwt
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509 import load_pem_x509_certificate
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATES_URL = ('https://www.googleapis.com/robot/v1/metadata/x509/'
+                    'securetoken@system.gserviceaccount.com')
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+
+class KeyFetchError(Exception):
+    """
+    Raised when the public keys cannot be fetched and no usable keys are
+    cached.
+    """
+
+
+class GoogleCertificateSource:
+    """
+    Fetches the X.509 certificates Google signs Firebase ID tokens with.
+    """
+    timeout = 10
+
+    def fetch(self):
+        """
+        Returns a dict of key id -> PEM and the number of seconds it may
+        be cached for, taken from the Cache-Control and Age headers.
+        """
+        response = requests.get(CERTIFICATES_URL, timeout=self.timeout)
+        response.raise_for_status()
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else 0
+        max_age -= int(response.headers.get('Age', 0))
+        return response.json(), max(max_age, 0)
+
+
+class LocalKeySource:
+    """
+    A key source with a freshly generated key pair, able to sign ID tokens.
+    Meant for tests and benchmarks.
+    """
+
+    def __init__(self, max_age=3600, kid='local'):
+        self.max_age = max_age
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def fetch(self):
+        pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        return {self.kid: pem}, self.max_age
+
+    def sign(self, claims):
+        return jwt.encode(claims, self.private_key, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+    def create_id_token(self, uid, **claims):
+        """
+        A valid ID token of the configured project for `uid`.
+        """
+        now = int(time.time())
+        project_id = get_project_id()
+        return self.sign({
+            'iss': ISSUER_PREFIX + project_id, 'aud': project_id, 'sub': uid,
+            'iat': now, 'auth_time': now, 'exp': now + 3600, **claims})
+
+
+def load_public_key(pem):
+    pem = pem.encode()
+    if b'CERTIFICATE' in pem:
+        return load_pem_x509_certificate(pem).public_key()
+    return serialization.load_pem_public_key(pem)
+
+
+class PublicKeyCache:
+    """
+    Public keys of a key source, cached for their max-age.
+    """
+    # Fraction of the max-age after which keys are refreshed in the background
+    refresh_ahead = 0.8
+    # Minimum seconds between fetches triggered by unknown key ids, and
+    # between retries of failed fetches
+    min_refresh_interval = 60
+    # Seconds expired keys are still used for while they cannot be refreshed
+    grace_period = 3600
+
+    def __init__(self, source):
+        self.source = source
+        self.keys = None
+        self.fetched_at = 0
+        self.refresh_at = 0
+        self.expires_at = 0
+        self.retry_at = 0
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def refresh(self):
+        keys, max_age = self.source.fetch()
+        parsed = {kid: load_public_key(pem) for kid, pem in keys.items()}
+        now = time.monotonic()
+        self.keys = parsed
+        self.fetched_at = now
+        self.refresh_at = now + max_age * self.refresh_ahead
+        self.expires_at = now + max_age
+
+    def try_refresh(self):
+        """
+        Refreshes the keys unless a fetch failed less than
+        min_refresh_interval seconds ago. If the keys cannot be refreshed,
+        the cached ones are kept until grace_period seconds after they
+        expired; KeyFetchError is raised after that or without cached keys.
+        """
+        now = time.monotonic()
+        usable = self.keys is not None and now < self.expires_at + self.grace_period
+        if now < self.retry_at:
+            if usable:
+                return
+            raise KeyFetchError('Firebase public keys are unavailable.')
+        try:
+            self.refresh()
+        except Exception as error:
+            self.retry_at = now + self.min_refresh_interval
+            if not usable:
+                raise KeyFetchError('Could not fetch the Firebase public keys.') from error
+            logger.warning('Could not refresh Firebase public keys, using the '
+                           'expired ones', exc_info=True)
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Could not refresh Firebase public keys')
+        finally:
+            self.refreshing = False
+
+    def get_keys(self):
+        now = time.monotonic()
+        if self.keys is None or now >= self.expires_at:
+            with self.lock:
+                if self.keys is None or time.monotonic() >= self.expires_at:
+                    self.try_refresh()
+        elif now >= self.refresh_at and not self.refreshing:
+            with self.lock:
+                if self.refreshing:
+                    return self.keys
+                self.refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self.keys
+
+    def get_key(self, kid):
+        key = self.get_keys().get(kid)
+        if key is None and time.monotonic() - self.fetched_at >= self.min_refresh_interval:
+            # The keys may have been rotated before they expired
+            with self.lock:
+                self.try_refresh()
+            key = self.keys.get(kid)
+        return key
+
+
+_key_cache = None
+
+
+def get_key_cache():
+    global _key_cache
+    if _key_cache is None:
+        _key_cache = PublicKeyCache(import_string(settings.FIREBASE_KEY_SOURCE)())
+    return _key_cache
+
+
+@receiver(setting_changed)
+def reset_key_cache(setting, **kwargs):
+    global _key_cache
+    if setting == 'FIREBASE_KEY_SOURCE':
+        _key_cache = None
+
+
+_app_lock = threading.Lock()
+
+
+def decrypt_credentials():
+    """
+    The service account credentials of settings.FIREBASE_CREDENTIALS_FILE,
+    decrypted in memory.
+    """
+    import pyAesCrypt
+    if not settings.FIREBASE_DECRYPT_KEY:
+        raise ImproperlyConfigured('FIREBASE_DECRYPT_KEY is not set.')
+    path = settings.FIREBASE_CREDENTIALS_FILE
+    size = settings.FIREBASE_DECRYPT_SIZE
+    size = int(size) if size else os.path.getsize(path)
+    decrypted = io.BytesIO()
+    with open(path, 'rb') as encrypted_file:
+        pyAesCrypt.decryptStream(encrypted_file, decrypted,
+                                 settings.FIREBASE_DECRYPT_KEY, 64 * 1024, size)
+    return json.loads(decrypted.getvalue())
+
+
+def get_app():
+    """
+    The default Firebase app, initialized on first use.
+    """
+    import firebase_admin
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    with _app_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            credentials = firebase_admin.credentials.Certificate(decrypt_credentials())
+            return firebase_admin.initialize_app(credentials)
+
+
+def get_project_id():
+    return settings.FIREBASE_PROJECT_ID or get_app().project_id
+
+
+def verify_id_token(id_token):
+    """
+    Verifies the signature and claims of a Firebase ID token and returns its
+    claims along with 'uid'. Raises ValueError for invalid tokens, and
+    KeyFetchError when the keys to verify them with cannot be fetched.
+    """
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.InvalidTokenError as error:
+        raise ValueError(str(error)) from error
+    if header.get('alg') != 'RS256' or not header.get('kid'):
+        raise ValueError('ID token must be signed with RS256 and have a key id.')
+    key = get_key_cache().get_key(header['kid'])
+    if key is None:
+        raise ValueError('ID token is signed with an unknown key.')
+
+    project_id = get_project_id()
+    try:
+        claims = jwt.decode(
+            id_token, key, algorithms=['RS256'], audience=project_id,
+            issuer=ISSUER_PREFIX + project_id,
+            options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']})
+    except jwt.InvalidTokenError as error:
+        raise ValueError(str(error)) from error
+
+    now = time.time()
+    subject = claims['sub']
+    if not isinstance(subject, str) or not 0 < len(subject) <= 128:
+        raise ValueError('ID token has an invalid subject.')
+    if claims['iat'] > now or claims.get('auth_time', 0) > now:
+        raise ValueError('ID token is issued in the future.')
+    claims['uid'] = subject
+    return claims
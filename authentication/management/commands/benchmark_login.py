@@ -0,0 +1,55 @@
+import time
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+from authentication import firebase
+
+
+class SlowKeySource(firebase.LocalKeySource):
+    """
+    A local key source which takes as long as fetching Google's certificates.
+    """
+
+    def __init__(self, max_age, latency):
+        super().__init__(max_age)
+        self.latency = latency
+
+    def fetch(self):
+        time.sleep(self.latency)
+        return super().fetch()
+
+
+class Command(BaseCommand):
+    help = ('Measures logins per second through POST /login/ with and without '
+            'the Firebase public key cache, in a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--fetch-latency', type=float, default=100,
+                            help='Milliseconds a key fetch takes')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(FIREBASE_PROJECT_ID='hackalog-benchmark'):
+                # max-age 0 makes every verification fetch the keys again
+                for label, max_age in (('without key cache', 0), ('with key cache', 3600)):
+                    source = SlowKeySource(max_age, options['fetch_latency'] / 1000)
+                    key_cache = firebase.PublicKeyCache(source)
+                    with mock.patch.object(firebase, 'get_key_cache', return_value=key_cache):
+                        rate = self.measure(source, options['logins'])
+                    self.stdout.write(f'{label:<20} {rate:>10.1f} logins/s')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure(self, source, logins):
+        client = APIClient()
+        id_token = source.create_id_token('benchmark-user', email='user@example.com')
+        started = time.perf_counter()
+        for _ in range(logins):
+            response = client.post('/login/', {'id_token': id_token})
+            assert response.status_code == 200, response.data
+        return logins / (time.perf_counter() - started)
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 02:31
+
+import authentication.colleges
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_user_photourl'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='college',
+            field=models.CharField(max_length=255, validators=[authentication.colleges.validate_college]),
+        ),
+    ]
@@ -1,8 +1,16 @@
+import hashlib
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
 from .utils import FirebaseAPI
 from django.contrib.auth import get_user_model
 from core.serializers import HackathonSerializer, TeamSerializer
+from core.fieldsets import SparseFieldsMixin, nested
 from core.models import Team
+from hackalog.coalescing import SingleFlight
+from hackalog.instrumentation import TimedSerializerMixin
+
+verifications = SingleFlight()
+user_upserts = SingleFlight()
 
 class ResponseSerializer(serializers.Serializer):
     token = serializers.CharField(max_length=500)
@@ -13,33 +21,45 @@ class LoginSerializer(serializers.Serializer):
     def validate_access_token(self, access_token):
         return FirebaseAPI.verify_id_token(access_token)
 
-    def validate(self, data):
+    def get_or_create_token(self, jwt):
+        """
+        The key of the token of the user of `jwt`, creating the user and the
+        token if needed. Both are inserted with ON CONFLICT DO NOTHING, so
+        that concurrent first logins read back the rows of whichever won.
+        """
         User = get_user_model()
-        id_token = data.get('id_token', None)
-        current_user = None
-        jwt = self.validate_access_token(id_token)
         uid = jwt['uid']
-        profile = User.objects.filter(uid=uid)
-
-        if profile:
-            current_user = profile[0]
-        else:
-            email = FirebaseAPI.get_email(jwt)
-            name = FirebaseAPI.get_name(jwt)
+        tokens = Token.objects.filter(user_id=uid).values_list('key', flat=True)
+        key = tokens.first()
+        if key is None:
             # We keep username=uid untill user explicitly provides it from frontend.
-            profile = User.objects.create(uid = uid,name = name, email = email, username=uid)
-            current_user = profile
+            User.objects.bulk_create([User(
+                uid=uid, name=FirebaseAPI.get_name(jwt),
+                email=FirebaseAPI.get_email(jwt), username=uid)], ignore_conflicts=True)
+            Token.objects.bulk_create([Token(key=Token.generate_key(), user_id=uid)],
+                                      ignore_conflicts=True)
+            key = tokens.get()
+        return key
 
-        data['profile'] = current_user
+    def validate(self, data):
+        id_token = data.get('id_token', None)
+        # Concurrent logins with the same ID token share one verification,
+        # and those of the same user one upsert
+        jwt = verifications.do(hashlib.sha256(id_token.encode()).digest(),
+                               lambda: self.validate_access_token(id_token))
+        data['token'] = user_upserts.do(jwt['uid'], lambda: self.get_or_create_token(jwt))
         return data
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     teams = serializers.SerializerMethodField()
+    included_as = ('users', 'username')
 
     def get_teams(self,obj):
-        team = Team.objects.filter(members=obj).select_related('hackathon')
-        serializer = TeamSerializer(team,many=True)
-        return serializer.data
+        # Use the teams loaded by core.models.team_detail_prefetches when present
+        team = getattr(obj, 'prefetched_teams', None)
+        if team is None:
+            team = Team.objects.filter(members=obj).select_related('hackathon')
+        return nested(self, 'teams', TeamSerializer, team, many=True)
 
     class Meta:        
         User = get_user_model()
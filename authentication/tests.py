@@ -1,3 +1,446 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import firebase_admin
+import pyAesCrypt
+import requests
+from cryptography.hazmat.primitives import serialization
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import SimpleTestCase, override_settings, skipUnlessDBFeature
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from hackalog.throttling import WindowRateThrottle
+from . import colleges, firebase, serializers
+from .backends import local_cache
+from .models import User
+from .serializers import LoginSerializer
 
-# Create your tests here.
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create(uid='uid', username='user', name='User')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_token_lookup_is_cached(self):
+        # token and user, then the profile and its teams
+        with self.assertNumQueries(3):
+            self.client.get('/profile/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/profile/')
+        self.assertEqual(response.data['username'], 'user')
+
+    def test_deleted_token_is_evicted(self):
+        self.client.get('/profile/')
+        self.token.delete()
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    def test_changed_user_is_evicted(self):
+        self.client.get('/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={
+        'MAX_SIZE': 10, 'LOCAL_TTL': 30, 'SHARED_CACHE': 'default',
+        'SHARED_TTL': 300})
+    def test_shared_cache(self):
+        self.client.get('/profile/')
+        # Another process only has the shared cache
+        local_cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get('/profile/')
+        self.token.delete()
+        local_cache.clear()
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    def test_lru_bound(self):
+        local_cache.clear()
+        for i in range(local_cache.max_size + 1):
+            local_cache.set(str(i), i)
+        self.assertIsNone(local_cache.get('0'))
+        self.assertEqual(local_cache.get(str(local_cache.max_size)),
+                         local_cache.max_size)
+
+
+class CountingKeySource(firebase.LocalKeySource):
+
+    def __init__(self, max_age=3600):
+        super().__init__(max_age)
+        self.fetches = 0
+        self.failing = False
+
+    def fetch(self):
+        self.fetches += 1
+        if self.failing:
+            raise requests.ConnectionError('Key source is down')
+        return super().fetch()
+
+
+@override_settings(FIREBASE_PROJECT_ID='hackalog-test',
+                   FIREBASE_KEY_SOURCE='authentication.tests.CountingKeySource')
+class FirebaseVerificationTests(SimpleTestCase):
+
+    def setUp(self):
+        firebase.reset_key_cache('FIREBASE_KEY_SOURCE')
+        self.key_cache = firebase.get_key_cache()
+        self.source = self.key_cache.source
+
+    def test_valid_token(self):
+        token = self.source.create_id_token('uid', email='user@example.com')
+        claims = firebase.verify_id_token(token)
+        self.assertEqual(claims['uid'], 'uid')
+        self.assertEqual(claims['email'], 'user@example.com')
+
+    def test_keys_are_cached_for_max_age(self):
+        for _ in range(3):
+            firebase.verify_id_token(self.source.create_id_token('uid'))
+        self.assertEqual(self.source.fetches, 1)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 3600):
+            firebase.verify_id_token(self.source.create_id_token('uid'))
+        self.assertEqual(self.source.fetches, 2)
+
+    def test_keys_are_refreshed_in_background(self):
+        firebase.verify_id_token(self.source.create_id_token('uid'))
+        with mock.patch('threading.Thread') as thread:
+            with mock.patch('time.monotonic', return_value=time.monotonic() + 3000):
+                firebase.verify_id_token(self.source.create_id_token('uid'))
+        thread.assert_called_once_with(
+            target=self.key_cache._refresh_in_background, daemon=True)
+        self.assertEqual(self.source.fetches, 1)
+
+    def test_invalid_tokens(self):
+        now = int(time.time())
+        other_source = firebase.LocalKeySource()
+        invalid = [
+            'not a token',
+            self.source.create_id_token('uid', aud='other-project'),
+            self.source.create_id_token('uid', iss='https://example.com'),
+            self.source.create_id_token('uid', exp=now - 1),
+            self.source.create_id_token('uid', iat=now + 600),
+            self.source.create_id_token(''),
+            # Signed by another key under the same key id
+            other_source.create_id_token('uid'),
+        ]
+        for token in invalid:
+            with self.assertRaises(ValueError):
+                firebase.verify_id_token(token)
+
+    def test_unknown_key_id(self):
+        token = firebase.LocalKeySource(kid='other').create_id_token('uid')
+        with self.assertRaises(ValueError):
+            firebase.verify_id_token(token)
+
+    def test_failed_fetch_without_keys(self):
+        self.source.failing = True
+        token = self.source.create_id_token('uid')
+        with self.assertRaises(firebase.KeyFetchError):
+            firebase.verify_id_token(token)
+        # Retried only after min_refresh_interval
+        with self.assertRaises(firebase.KeyFetchError):
+            firebase.verify_id_token(token)
+        self.assertEqual(self.source.fetches, 1)
+
+    def test_expired_keys_are_used_while_fetches_fail(self):
+        token = self.source.create_id_token('uid')
+        firebase.verify_id_token(token)
+        self.source.failing = True
+        start = time.monotonic()
+        with mock.patch('time.monotonic', return_value=start + 3600):
+            with self.assertLogs('authentication.firebase', 'WARNING'):
+                self.assertEqual(firebase.verify_id_token(token)['uid'], 'uid')
+        self.assertEqual(self.source.fetches, 2)
+        # Retried only after min_refresh_interval
+        with self.assertLogs('authentication.firebase', 'WARNING'):
+            for offset, fetches in [(3630, 2), (3700, 3)]:
+                with mock.patch('time.monotonic', return_value=start + offset):
+                    self.assertEqual(firebase.verify_id_token(token)['uid'], 'uid')
+                self.assertEqual(self.source.fetches, fetches)
+        with mock.patch('time.monotonic', return_value=start + 7200):
+            with self.assertRaises(firebase.KeyFetchError):
+                firebase.verify_id_token(token)
+        self.source.failing = False
+        with mock.patch('time.monotonic', return_value=start + 7300):
+            firebase.verify_id_token(token)
+        self.assertEqual(self.source.fetches, 5)
+
+
+@override_settings(FIREBASE_PROJECT_ID='hackalog-test',
+                   FIREBASE_KEY_SOURCE='authentication.firebase.LocalKeySource')
+class FirebaseAppTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'firebase_admin.aes')
+        private_key = firebase.LocalKeySource().private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()).decode()
+        credentials = json.dumps({
+            'type': 'service_account', 'project_id': 'hackalog-test',
+            'private_key_id': 'key', 'private_key': private_key,
+            'client_email': 'admin@hackalog-test.iam.gserviceaccount.com',
+            'client_id': '1', 'token_uri': 'https://oauth2.googleapis.com/token',
+        }).encode()
+        with open(self.path, 'wb') as encrypted_file:
+            pyAesCrypt.encryptStream(io.BytesIO(credentials), encrypted_file,
+                                     'password', 64 * 1024)
+
+    def settings(self, **kwargs):
+        return override_settings(**{
+            'FIREBASE_CREDENTIALS_FILE': self.path, 'FIREBASE_DECRYPT_KEY': 'password',
+            'FIREBASE_DECRYPT_SIZE': None, 'FIREBASE_PROJECT_ID': None, **kwargs})
+
+    def test_credentials_are_decrypted_in_memory(self):
+        with self.settings():
+            credentials = firebase.decrypt_credentials()
+        self.assertEqual(credentials['project_id'], 'hackalog-test')
+        self.assertEqual(os.listdir(self.directory), ['firebase_admin.aes'])
+
+        with self.settings(FIREBASE_DECRYPT_KEY=None):
+            with self.assertRaises(ImproperlyConfigured):
+                firebase.decrypt_credentials()
+
+    def test_app_is_initialized_on_first_use(self):
+        with self.assertRaises(ValueError):
+            firebase_admin.get_app()
+        with self.settings():
+            app = firebase.get_app()
+            self.addCleanup(firebase_admin.delete_app, app)
+            self.assertIs(firebase.get_app(), app)
+            self.assertEqual(firebase.get_project_id(), 'hackalog-test')
+
+
+@override_settings(FIREBASE_PROJECT_ID='hackalog-test',
+                   FIREBASE_KEY_SOURCE='authentication.firebase.LocalKeySource')
+class LoginTests(APITestCase):
+
+    def test_login_creates_user_and_token(self):
+        id_token = firebase.get_key_cache().source.create_id_token(
+            'uid', email='user@example.com', name='User')
+        response = self.client.post('/login/', {'id_token': id_token})
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(uid='uid')
+        self.assertEqual(user.email, 'user@example.com')
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+
+    def test_login_queries(self):
+        jwt = {'uid': 'uid', 'email': 'user@example.com', 'name': 'User'}
+        # Token lookup, user and token inserts, token read back
+        with self.assertNumQueries(4):
+            key = LoginSerializer().get_or_create_token(jwt)
+        with self.assertNumQueries(1):
+            self.assertEqual(LoginSerializer().get_or_create_token(jwt), key)
+        Token.objects.all().delete()
+        with self.assertNumQueries(4):
+            self.assertNotEqual(LoginSerializer().get_or_create_token(jwt), key)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_login_racing_another_first_login(self):
+        jwt = {'uid': 'uid', 'email': 'user@example.com', 'name': 'User'}
+        other = {}
+
+        def concurrent_login(execute, sql, params, many, context):
+            # Creates the user and token between the lookup and the inserts
+            if sql.startswith('INSERT') and not other:
+                other['key'] = None
+                user = User.objects.create(uid='uid', username='uid', name='Other')
+                other['key'] = Token.objects.create(user=user).key
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(concurrent_login):
+            key = LoginSerializer().get_or_create_token(jwt)
+        self.assertEqual(key, other['key'])
+        self.assertEqual(User.objects.get().name, 'Other')
+        self.assertEqual(Token.objects.count(), 1)
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.post('/login/', {'id_token': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_key_fetch_failure_is_unavailable(self):
+        firebase.reset_key_cache('FIREBASE_KEY_SOURCE')
+        self.addCleanup(firebase.reset_key_cache, 'FIREBASE_KEY_SOURCE')
+        source = firebase.get_key_cache().source
+        id_token = source.create_id_token('uid', email='user@example.com')
+        with mock.patch.object(source, 'fetch', side_effect=requests.ConnectionError):
+            response = self.client.post('/login/', {'id_token': id_token})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.exists())
+
+    def throttle_login(self, num_proxies):
+        return override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'NUM_PROXIES': num_proxies,
+            'DEFAULT_THROTTLE_RATES': {'login_ip': '2/min'}})
+
+    @mock.patch.object(WindowRateThrottle, 'timer', return_value=30.0)
+    def test_login_is_throttled_per_address(self, timer):
+        cache.clear()
+        with self.throttle_login(0):
+            for _ in range(2):
+                self.client.post('/login/', {'id_token': 'invalid'})
+            response = self.client.post('/login/', {'id_token': 'invalid'})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+            # Without proxies, X-Forwarded-For comes from the client
+            response = self.client.post('/login/', {'id_token': 'invalid'},
+                                        HTTP_X_FORWARDED_FOR='10.0.0.3')
+            self.assertEqual(response.status_code, 429)
+            response = self.client.post('/login/', {'id_token': 'invalid'},
+                                        REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(WindowRateThrottle, 'timer', return_value=30.0)
+    def test_clients_behind_a_proxy_are_throttled_apart(self, timer):
+        cache.clear()
+        with self.throttle_login(1):
+            for _ in range(2):
+                self.client.post('/login/', {'id_token': 'invalid'},
+                                 HTTP_X_FORWARDED_FOR='10.0.0.3')
+            # The proxy appends the address of the client to any sent by it
+            response = self.client.post('/login/', {'id_token': 'invalid'},
+                                        HTTP_X_FORWARDED_FOR='10.0.0.9, 10.0.0.3')
+            self.assertEqual(response.status_code, 429)
+            response = self.client.post('/login/', {'id_token': 'invalid'},
+                                        HTTP_X_FORWARDED_FOR='10.0.0.4')
+            self.assertEqual(response.status_code, 400)
+
+    def test_addresses_are_not_throttled_without_proxy_count(self):
+        cache.clear()
+        with self.throttle_login(None):
+            for _ in range(3):
+                response = self.client.post('/login/', {'id_token': 'invalid'})
+            self.assertEqual(response.status_code, 400)
+
+
+class LoginCoalescingTests(SimpleTestCase):
+
+    def test_concurrent_logins_share_verification_and_upsert(self):
+        verified, upserted = [], []
+
+        def verify(serializer, id_token):
+            verified.append(id_token)
+            time.sleep(0.1)
+            return {'uid': 'uid'}
+
+        def get_or_create_token(serializer, jwt):
+            upserted.append(jwt['uid'])
+            time.sleep(0.1)
+            return 'key'
+
+        tokens = []
+        started = threading.Barrier(5)
+
+        def login():
+            serializer = LoginSerializer(data={'id_token': 'token'})
+            started.wait()
+            serializer.is_valid(raise_exception=True)
+            tokens.append(serializer.validated_data['token'])
+
+        with mock.patch.object(LoginSerializer, 'validate_access_token', verify), \
+                mock.patch.object(LoginSerializer, 'get_or_create_token', get_or_create_token):
+            threads = [threading.Thread(target=login) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual((verified, upserted), (['token'], ['uid']))
+        self.assertEqual(tokens, ['key'] * 5)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentLoginTests(APITransactionTestCase):
+    """
+    Needs a database allowing concurrent writers, see TEST_DATABASE in
+    settings.
+    """
+
+    def test_simultaneous_first_logins(self):
+        source = firebase.get_key_cache().source
+        # Distinct ID tokens of one user, so that logins are not coalesced
+        # before the upsert
+        id_tokens = [source.create_id_token('uid', jti=str(i)) for i in range(10)]
+        barrier = threading.Barrier(len(id_tokens))
+        responses = []
+
+        def login(id_token):
+            client = APIClient()
+            barrier.wait()
+            try:
+                responses.append(client.post('/login/', {'id_token': id_token}))
+            finally:
+                connections.close_all()
+
+        # Every login runs its own upsert
+        with mock.patch.object(serializers.user_upserts, 'do',
+                               lambda key, function: function()):
+            threads = [threading.Thread(target=login, args=(id_token,))
+                       for id_token in id_tokens]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual([response.status_code for response in responses], [200] * 10)
+        key = Token.objects.get(user_id='uid').key
+        self.assertEqual({response.data['token'] for response in responses}, {key})
+        self.assertEqual(User.objects.filter(uid='uid').count(), 1)
+
+
+class CollegeTests(APITestCase):
+
+    def test_search(self):
+        index = colleges.CollegeIndex([
+            'ABES Engineering College, Ghaziabad',
+            'Aligarh Muslim University',
+            'Indian Institute of Technology, Roorkee',
+            'Institute of Engineering and Technology, Lucknow',
+        ])
+        # Names starting with the query come first
+        self.assertEqual(index.search('in'), [
+            'Indian Institute of Technology, Roorkee',
+            'Institute of Engineering and Technology, Lucknow',
+        ])
+        self.assertEqual(index.search('engin luck'),
+                         ['Institute of Engineering and Technology, Lucknow'])
+        self.assertEqual(index.search('technology, roorkee'),
+                         ['Indian Institute of Technology, Roorkee'])
+        # Misspelt queries fall back to close matches
+        self.assertEqual(index.search('aligarh muslim universty'),
+                         ['Aligarh Muslim University'])
+        self.assertEqual(index.search('in', limit=1),
+                         ['Indian Institute of Technology, Roorkee'])
+        self.assertIn('Aligarh Muslim University', index)
+        self.assertNotIn('aligarh muslim university', index)
+
+    def test_search_view(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/colleges/?q=engineering&limit=5')
+        self.assertEqual(len(response.data), 5)
+        for name in response.data:
+            self.assertIn('engineering', name.lower())
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_profile_college_is_validated(self):
+        user = User.objects.create(uid='uid', username='user', name='User')
+        self.client.force_authenticate(user)
+        response = self.client.patch('/profile/', {'college': 'Unknown college'})
+        self.assertEqual(response.status_code, 400)
+        college = colleges.get_index().names[0]
+        response = self.client.patch('/profile/', {'college': college})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['college'], college)
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import LoginView, ProfileView, UserDetail
+from .views import LoginView, ProfileView, UserDetail, CollegeSearchView
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('profile/', ProfileView.as_view(), name='profile'),
     path('profile/<str:username>/', UserDetail.as_view(), name='get_profile'),
+    path('colleges/', CollegeSearchView.as_view(), name='colleges'),
 ]
\ No newline at end of file
@@ -1,15 +1,29 @@
-from firebase_admin import auth
-from rest_framework.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_400_BAD_REQUEST
-from rest_framework.exceptions import ValidationError
+from rest_framework.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_400_BAD_REQUEST, HTTP_503_SERVICE_UNAVAILABLE
+from rest_framework.exceptions import APIException, ValidationError
+from . import firebase
+
+
+class VerificationUnavailable(APIException):
+    status_code = HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Firebase ID Tokens cannot be verified right now, try again later.'
+    default_code = 'verification_unavailable'
+
 
 class FirebaseAPI:
+    @classmethod
+    def get_app(cls):
+        # The Admin SDK is initialized on first use, see authentication.firebase
+        return firebase.get_app()
+
     @classmethod
     def verify_id_token(cls, id_token):
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = firebase.verify_id_token(id_token)
             return decoded_token
-        except:
+        except ValueError:
             raise ValidationError('Invalid Firebase ID Token.', HTTP_422_UNPROCESSABLE_ENTITY)
+        except firebase.KeyFetchError:
+            raise VerificationUnavailable()
 
     @classmethod
     def get_email(cls, jwt):
@@ -23,4 +37,5 @@ class FirebaseAPI:
 
     @classmethod
     def delete_user_by_uid(cls, uid):
-        auth.delete_user(uid) 
\ No newline at end of file
+        from firebase_admin import auth
+        auth.delete_user(uid, app=cls.get_app()) 
\ No newline at end of file
@@ -1,32 +1,32 @@
 from rest_framework import permissions
 from rest_framework import generics
 from rest_framework import status
+from rest_framework import views
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
 from django.utils.decorators import method_decorator
 from django.contrib.auth import get_user_model
+from django.utils.cache import patch_cache_control
+from core.fieldsets import SparseFieldsetMixin
+from . import colleges
 from .serializers import (
     LoginSerializer, ResponseSerializer, ProfileSerializer)
 
-def create_auth_token(user):
-    token, _ = Token.objects.get_or_create(user=user)
-    return token
-
 class LoginView(generics.GenericAPIView):
     authentication_classes = []
     permission_classes = (permissions.AllowAny,)
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
 
     def post(self,request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        profile = serializer.validated_data['profile']
-        token = create_auth_token(profile)
+        token = serializer.validated_data['token']
         response = ResponseSerializer({'token':token})
         return Response(response.data,status.HTTP_200_OK)
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class ProfileView(SparseFieldsetMixin, generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = ProfileSerializer
 
@@ -35,8 +35,37 @@ class ProfileView(generics.RetrieveUpdateAPIView):
         return User.objects.get(uid = self.request.user.uid)
 
 @method_decorator(name='get', decorator=swagger_auto_schema(operation_id='user_profile_read'))
-class UserDetail(generics.RetrieveAPIView):
+class UserDetail(SparseFieldsetMixin, generics.RetrieveAPIView):
     User = get_user_model()
     lookup_field = 'username'
     queryset = User.objects.all()
-    serializer_class = ProfileSerializer
\ No newline at end of file
+    serializer_class = ProfileSerializer
+
+query_params = [
+    openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Query parameter - Start of the college name or of its words. Returns the first colleges if not specified."),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Query parameter - Maximum number of colleges, 20 if not specified and at most 100."),
+]
+
+@method_decorator(name='get', decorator=swagger_auto_schema(
+    manual_parameters=query_params,
+    responses={200: openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))}))
+class CollegeSearchView(views.APIView):
+    """
+    get:
+    Returns the names of the colleges matching the query, best matches first.
+    """
+    authentication_classes = []
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        names = colleges.get_index().search(request.query_params.get('q', ''), limit)
+        response = Response(names, status.HTTP_200_OK)
+        # The college list only changes with a deployment
+        patch_cache_control(response, public=True, max_age=3600)
+        return response
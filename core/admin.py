@@ -1,11 +1,41 @@
 from django.contrib import admin
-from .models import Hackathon, Submission, Team
+from .models import Hackathon, Submission, Team, TeamMembership
 admin.site.register(Hackathon)
 admin.site.register(Submission)
 
 
+class TeamMembershipInline(admin.TabularInline):
+    model = TeamMembership
+    fields = ('user',)
+    raw_id_fields = ('user',)
+    extra = 0
+
+
 class TeamsPageAdmin(admin.ModelAdmin):
-    list_display = ('name', 'hackathon',)
+    list_display = ('name', 'hackathon', 'member_count')
+    inlines = (TeamMembershipInline,)
+
+    def get_readonly_fields(self, request, obj=None):
+        # The memberships of a team repeat its hackathon, which the
+        # (user, hackathon) constraint and the snapshots rely on
+        if obj is not None:
+            return ('hackathon',)
+        return ()
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is TeamMembership:
+            for membership in formset.save(commit=False):
+                membership.hackathon_id = form.instance.hackathon_id
+                membership.save()
+            for membership in formset.deleted_objects:
+                membership.delete()
+        else:
+            super().save_formset(request, form, formset, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline memberships are saved without the m2m_changed signal
+        Team.objects.filter(pk=form.instance.pk).recount_members()
 
 
 admin.site.register(Team, TeamsPageAdmin)
@@ -0,0 +1,296 @@
+"""
+Query-count and latency benchmark for the core and authentication endpoints.
+
+`seed` builds a synthetic dataset and `run` calls every route of core.urls
+and authentication.urls through the DRF test client, reporting the number of
+SQL queries, p50/p95 latency and response size of each endpoint. Requests
+which write to the database are rolled back so every iteration sees the same
+data. See `python manage.py benchmark --help`.
+"""
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from authentication import urls as auth_urls
+from authentication.backends import local_cache as token_cache
+from authentication import colleges, firebase
+from core import urls as core_urls
+from .models import Hackathon, Team, TeamMembership, Submission
+
+User = get_user_model()
+
+STATUSES = ('Completed', 'Ongoing', 'Upcoming')
+
+
+def _profile(uid, **kwargs):
+    return User(
+        uid=uid, username=uid, name=uid, email=f'{uid}@example.com',
+        college=colleges.get_index().names[0], github_handle=uid, bio='bio',
+        interests='interests', **kwargs)
+
+
+def seed(hackathons=3, teams=50, members=4, submissions=50):
+    """
+    Creates `hackathons` hackathons cycling through completed, ongoing and
+    upcoming ones, each with `teams` teams of `members` members and
+    `submissions` submissions (at most one per team).
+    Returns a dict describing the objects the endpoint cases refer to.
+    """
+    now = timezone.now()
+    actor, free, admin = User.objects.bulk_create([
+        _profile('bench-actor'),
+        _profile('bench-free'),
+        _profile('bench-admin', is_staff=True, is_superuser=True),
+    ])
+    tokens = {user.uid: Token.objects.create(user=user).key
+              for user in (actor, free, admin)}
+
+    dataset = {'tokens': tokens, 'actor': actor.uid}
+    for index in range(max(hackathons, len(STATUSES))):
+        status = STATUSES[index % len(STATUSES)]
+        start, end = {
+            'Completed': (now - timedelta(days=10), now - timedelta(days=5)),
+            'Ongoing': (now - timedelta(days=1), now + timedelta(days=1)),
+            'Upcoming': (now + timedelta(days=5), now + timedelta(days=10)),
+        }[status]
+        hackathon = Hackathon.objects.create(
+            title=f'Hackathon {index}', slug=f'hackathon-{index}',
+            tagline='tagline ' * 10, description='description ' * 100,
+            start=start, end=end, max_team_size=members + 1,
+            results_declared=status == 'Completed')
+
+        users = User.objects.bulk_create([
+            _profile(f'bench-{index}-{team}-{member}')
+            for team in range(teams) for member in range(1, members)
+        ])
+        team_objs = Team.objects.bulk_create([
+            Team(name=f'Team {team}', hackathon=hackathon,
+                 team_id=f'h{index:03d}t{team:010d}',
+                 member_count=members if team == 0 else members - 1,
+                 leader=actor if team == 0 else users[team * (members - 1)])
+            for team in range(teams)
+        ])
+        memberships = [TeamMembership(team=team_objs[0], user=actor, hackathon=hackathon)]
+        for team in range(teams):
+            memberships.extend(
+                TeamMembership(team=team_objs[team], user=user, hackathon=hackathon)
+                for user in users[team * (members - 1):(team + 1) * (members - 1)])
+        TeamMembership.objects.bulk_create(memberships)
+
+        # The actor's team in an ongoing hackathon is left without a
+        # submission so that creating one can be benchmarked.
+        first = 1 if status == 'Ongoing' else 0
+        submission_objs = Submission.objects.bulk_create([
+            Submission(team=team, hackathon=hackathon, score=(i * 7) % 101,
+                       title=f'Submission {i}', description='description ' * 20,
+                       submission_url='https://example.com/')
+            for i, team in enumerate(team_objs[first:first + submissions])
+        ])
+        dataset.setdefault(status, {
+            'slug': hackathon.slug,
+            'team': team_objs[0].team_id,
+            'other_team': team_objs[-1].team_id,
+            'submission': submission_objs[0].id if submission_objs else None,
+        })
+    return dataset
+
+
+def get_cases(dataset):
+    """
+    The requests made against every route. Each case is a dict with name,
+    method, path, user (None for anonymous), data and expected status.
+    """
+    completed = dataset['Completed']
+    ongoing = dataset['Ongoing']
+    upcoming = dataset['Upcoming']
+    actor = dataset['actor']
+    return [
+        dict(name='hackathon list', method='get', path='/hackathons/'),
+        dict(name='hackathon list (ongoing)', method='get',
+             path='/hackathons/?query=ongoing'),
+        dict(name='hackathon create', method='post', path='/hackathons/',
+             user='bench-admin', status=201, data={
+                 'title': 'New', 'slug': 'new',
+                 'start': upcoming['start'], 'end': upcoming['end']}),
+        dict(name='hackathon list (user status)', method='get',
+             path='/hackathons/?with_user_status=1', user=actor),
+        dict(name='hackathon detail', method='get',
+             path=f'/hackathons/{completed["slug"]}/'),
+        dict(name='hackathon detail (member)', method='get',
+             path=f'/hackathons/{completed["slug"]}/', user=actor),
+        dict(name='hackathon update', method='patch',
+             path=f'/hackathons/{upcoming["slug"]}/', user='bench-admin',
+             data={'tagline': 'updated'}),
+        dict(name='team list', method='get',
+             path=f'/hackathons/{completed["slug"]}/teams/'),
+        dict(name='team list (collapsed)', method='get',
+             path=f'/hackathons/{completed["slug"]}/teams/?expand='),
+        dict(name='team list (sparse)', method='get',
+             path=f'/hackathons/{completed["slug"]}/teams/'
+                  '?fields=name,team_id,members.username,leader.username'
+                  '&expand=members,leader'),
+        dict(name='team list (user specific)', method='get',
+             path=f'/hackathons/{completed["slug"]}/teams/?user_specific=y',
+             user=actor),
+        dict(name='team create', method='post',
+             path=f'/hackathons/{upcoming["slug"]}/teams/', user='bench-free',
+             status=201, data={'name': 'New team'}),
+        dict(name='team join', method='patch',
+             path=f'/hackathons/{upcoming["slug"]}/teams/join/{upcoming["other_team"]}/',
+             user='bench-free'),
+        dict(name='submission list (completed)', method='get',
+             path=f'/hackathons/{completed["slug"]}/submissions/'),
+        dict(name='submission list (member)', method='get',
+             path=f'/hackathons/{ongoing["slug"]}/submissions/', user=actor),
+        dict(name='submission list (superuser)', method='get',
+             path=f'/hackathons/{ongoing["slug"]}/submissions/',
+             user='bench-admin'),
+        dict(name='submission create', method='post',
+             path=f'/hackathons/{ongoing["slug"]}/submissions/', user=actor,
+             status=201, data={
+                 'team': ongoing['team'], 'title': 'New',
+                 'submission_url': 'https://example.com/new'}),
+        dict(name='leaderboard', method='get',
+             path=f'/hackathons/{completed["slug"]}/leaderboard/'),
+        dict(name='leaderboard rank', method='get',
+             path=f'/hackathons/{completed["slug"]}/leaderboard/me/', user=actor),
+        dict(name='team detail', method='get',
+             path=f'/teams/{completed["team"]}/'),
+        dict(name='team update', method='patch',
+             path=f'/teams/{upcoming["team"]}/', user=actor,
+             data={'name': 'Renamed'}),
+        dict(name='team member exit', method='patch',
+             path=f'/teams/{upcoming["team"]}/member-exit/{upcoming["team_member"]}',
+             user=actor),
+        dict(name='submission detail', method='get',
+             path=f'/submissions/{completed["submission"]}/'),
+        dict(name='submission update', method='patch',
+             path=f'/submissions/{completed["actor_submission"]}/', user=actor,
+             data={'title': 'Updated'}),
+        dict(name='login', method='post', path='/login/',
+             data={'id_token': dataset.get('id_token')}),
+        dict(name='profile', method='get', path='/profile/', user=actor),
+        dict(name='profile update', method='patch', path='/profile/',
+             user=actor, data={'bio': 'updated'}),
+        dict(name='user detail', method='get',
+             path=f'/profile/{dataset["actor"]}/'),
+        dict(name='college search', method='get', path='/colleges/?q=engineering'),
+    ]
+
+
+def uncovered_routes(cases):
+    """
+    Routes of core.urls and authentication.urls which no case requests.
+    """
+    routes = {str(pattern.pattern)
+              for pattern in core_urls.urlpatterns + auth_urls.urlpatterns}
+    covered = {resolve(case['path'].split('?')[0]).route for case in cases}
+    return sorted(routes - covered)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def _request(client, case, tokens):
+    if case.get('user'):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + tokens[case['user']])
+    else:
+        client.credentials()
+    with transaction.atomic():
+        response = getattr(client, case['method'])(
+            case['path'], case.get('data'), format='json')
+        transaction.set_rollback(True)
+    return response
+
+
+def measure(case, tokens, iterations=20):
+    """
+    Requests the case `iterations` times and returns its measurements.
+    The first request is made with empty caches.
+    """
+    client = APIClient(raise_request_exception=False)
+    latencies = []
+    queries = []
+    cache.clear()
+    token_cache.clear()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = _request(client, case, tokens)
+            latencies.append((time.perf_counter() - started) * 1000)
+        # BEGIN and ROLLBACK of the rollback wrapper are not made by the endpoint
+        queries.append(sum(1 for query in captured.captured_queries
+                           if query['sql'] not in ('BEGIN', 'ROLLBACK')))
+    return {
+        'name': case['name'],
+        'method': case['method'].upper(),
+        'path': case['path'],
+        'status': response.status_code,
+        'expected_status': case.get('status', 200),
+        'queries': queries[0],
+        'warm_queries': queries[-1],
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'bytes': len(response.content),
+    }
+
+
+def run(dataset, iterations=20):
+    """
+    Measures every case of `get_cases(dataset)`.
+    """
+    completed = dataset['Completed']
+    upcoming = dataset['Upcoming']
+    completed['actor_submission'] = Submission.objects.get(
+        hackathon__slug=completed['slug'], team__team_id=completed['team']).id
+    upcoming['team_member'] = Team.objects.get(
+        team_id=upcoming['team']).members.exclude(
+            uid=dataset['actor']).values_list('username', flat=True)[0]
+    hackathon = Hackathon.objects.get(slug=upcoming['slug'])
+    upcoming['start'] = hackathon.start.isoformat()
+    upcoming['end'] = hackathon.end.isoformat()
+
+    cases = get_cases(dataset)
+    missing = uncovered_routes(cases)
+    if missing:
+        raise ValueError(f'No benchmark case for routes: {", ".join(missing)}')
+    # Logins are verified against a local key instead of Google's
+    with override_settings(FIREBASE_KEY_SOURCE='authentication.firebase.LocalKeySource',
+                           FIREBASE_PROJECT_ID='hackalog-benchmark'):
+        dataset['id_token'] = firebase.get_key_cache().source.create_id_token(
+            dataset['actor'], email=f'{dataset["actor"]}@example.com')
+        return [measure(case, dataset['tokens'], iterations)
+                for case in get_cases(dataset)]
+
+
+def compare(results, baseline, latency_tolerance=None):
+    """
+    Returns a list of messages for every measurement exceeding the baseline.
+    Latency is only compared when `latency_tolerance` (a factor) is given.
+    """
+    baseline = {entry['name']: entry for entry in baseline['results']}
+    failures = []
+    for result in results:
+        expected = baseline.get(result['name'])
+        if expected is None:
+            continue
+        for key in ('queries', 'warm_queries'):
+            if result[key] > expected[key]:
+                failures.append(
+                    f'{result["name"]}: {result[key]} {key.replace("_", " ")} '
+                    f'(baseline {expected[key]})')
+        if latency_tolerance and result['p95_ms'] > expected['p95_ms'] * latency_tolerance:
+            failures.append(
+                f'{result["name"]}: p95 {result["p95_ms"]}ms '
+                f'(baseline {expected["p95_ms"]}ms x {latency_tolerance})')
+    return failures
@@ -0,0 +1,99 @@
+"""
+Versioned response cache for the public hackathon endpoints.
+
+Every cache key contains a version counter which the signals in core.signals
+bump whenever a Hackathon, Team or Submission is saved or deleted, so all
+cached responses are invalidated at once without tracking individual keys.
+A cached response is also discarded once any hackathon it covers starts or
+ends, because the status of a hackathon changes with the clock alone.
+"""
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'hackathons:version'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the current time rather than 1, so that entries cached
+        # before the counter was evicted can never be served again.
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """
+    Invalidates every cached hackathon response.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+
+
+def next_status_change(queryset, now):
+    """
+    The first start or end of the hackathons in `queryset` after `now`.
+    """
+    boundaries = queryset.aggregate(
+        start=Min('start', filter=Q(start__gt=now)),
+        end=Min('end', filter=Q(end__gt=now)))
+    return min(filter(None, boundaries.values()), default=None)
+
+
+class CachedResponseMixin:
+    """
+    Caches successful GET responses of a view under its path and query
+    parameters, and answers conditional requests with 304 Not Modified.
+    Views define `get_status_queryset()`, the hackathons whose status
+    the response depends on.
+    """
+
+    def is_cacheable(self, request):
+        return True
+
+    def get_status_queryset(self):
+        raise NotImplementedError
+
+    def get_cache_key(self, request):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return f'hackathons:{get_version()}:{request.path}?{params}'
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().get(request, *args, **kwargs)
+
+        now = timezone.now()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None or (entry['valid_until'] and entry['valid_until'] <= now):
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(response.data, sort_keys=True, default=str)
+            entry = {
+                'data': response.data,
+                'etag': '"%s"' % hashlib.md5(content.encode()).hexdigest(),
+                'last_modified': int(time.time()),
+                'valid_until': next_status_change(self.get_status_queryset(), now),
+            }
+            cache.set(key, entry, settings.HACKATHON_CACHE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified'])
+        if response is None:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
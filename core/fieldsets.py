@@ -0,0 +1,156 @@
+"""
+Sparse fieldsets for the team, submission and profile endpoints.
+
+Views using SparseFieldsetMixin accept two query parameters:
+
+* `fields`, comma separated field names, dotted for nested objects
+  (`fields=name,members.username`). Only these fields are serialized.
+* `expand`, comma separated paths of the nested objects to embed
+  (`expand=members,members.teams`). Nested objects which are not listed are
+  replaced by a reference (the slug of a hackathon, the team_id of a team,
+  the username of a user) and serialized once in the `included` block of
+  the response, keyed by kind and reference. `expand=` alone collapses
+  every nested object.
+
+Responses without either parameter are unchanged.
+"""
+from rest_framework import status
+
+
+def join(path, name):
+    return f'{path}.{name}' if path else name
+
+
+def split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class Fieldset:
+    """
+    The requested fields and expansions of a request, along with the
+    objects side-loaded while serializing its response.
+    `fields` and `expand` are sets of dotted paths, None for all.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+        self.included = {}
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        The Fieldset requested by `request`, None without any parameter.
+        """
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        if fields is None and expand is None:
+            return None
+        return cls(None if fields is None else split(fields),
+                   None if expand is None else split(expand))
+
+    def wants(self, path):
+        """
+        Whether the field at `path` is serialized: it, one of its ancestors
+        or one of its descendants was requested.
+        """
+        if self.fields is None:
+            return True
+        parts = path.split('.')
+        if any('.'.join(parts[:i]) in self.fields for i in range(1, len(parts) + 1)):
+            return True
+        return any(field.startswith(path + '.') for field in self.fields)
+
+    def expands(self, path):
+        """
+        Whether the nested object at `path` is embedded.
+        """
+        if self.expand is None:
+            return True
+        return path in self.expand or any(
+            expanded.startswith(path + '.') for expanded in self.expand)
+
+    def include(self, kind, reference, serialize):
+        """
+        Side-loads the result of `serialize()` under `kind` and `reference`
+        unless an object is already included there.
+        """
+        objects = self.included.setdefault(kind, {})
+        if reference not in objects:
+            # Reserved first, so that objects referring back are not
+            # serialized again
+            objects[reference] = None
+            objects[reference] = serialize()
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin dropping the fields not wanted by the Fieldset in its
+    context. `included_as` is the (kind, reference field) under which the
+    objects of the serializer are side-loaded, e.g. ('hackathons', 'slug').
+    """
+    included_as = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        path = self.context.get('fieldset_path', '')
+        if fieldset is None or path is None:
+            return fields
+        return {name: field for name, field in fields.items()
+                if fieldset.wants(join(path, name))}
+
+
+def nested(serializer, name, serializer_class, instance, many=False):
+    """
+    The representation of `instance`, the `name` field of the object
+    `serializer` is serializing: embedded by `serializer_class`, or a
+    reference when the Fieldset of the request does not expand it.
+    Side-loaded objects are not filtered and have all their nested objects
+    collapsed.
+    """
+    fieldset = serializer.context.get('fieldset')
+    if fieldset is None:
+        return serializer_class(instance, many=many).data
+    path = serializer.context.get('fieldset_path', '')
+    if path is not None and fieldset.expands(join(path, name)):
+        return serializer_class(instance, many=many, context={
+            **serializer.context, 'fieldset_path': join(path, name)}).data
+
+    kind, field = serializer_class.included_as
+    context = {**serializer.context, 'fieldset_path': None}
+    objects = (instance.all() if hasattr(instance, 'all') else instance) if many else [instance]
+    references = []
+    for obj in objects:
+        reference = getattr(obj, field)
+        fieldset.include(kind, reference,
+                         lambda: serializer_class(obj, context=context).data)
+        references.append(reference)
+    return references if many else references[0]
+
+
+class SparseFieldsetMixin:
+    """
+    View mixin passing the Fieldset of the request to its serializers and
+    adding the side-loaded objects to successful responses as `included`.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = (Fieldset.from_request(self.request)
+                              if self.request is not None else None)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            context['fieldset'] = fieldset
+        return context
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        fieldset = getattr(self, '_fieldset', None)
+        if (fieldset is not None and status.is_success(response.status_code)
+                and isinstance(response.data, dict)):
+            response.data['included'] = fieldset.included
+        return super().finalize_response(request, response, *args, **kwargs)
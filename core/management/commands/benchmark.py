@@ -0,0 +1,85 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core import benchmark
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'core', 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Seeds a synthetic dataset in a throwaway test database and reports '
+            'query count, latency and response size of every endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hackathons', type=int, default=3)
+        parser.add_argument('--teams', type=int, default=50,
+                            help='Teams per hackathon')
+        parser.add_argument('--members', type=int, default=4,
+                            help='Members per team')
+        parser.add_argument('--submissions', type=int, default=50,
+                            help='Submissions per hackathon')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                            help='Baseline file to compare against')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results to the baseline file')
+        parser.add_argument('--latency-tolerance', type=float, default=None,
+                            help='Fail if p95 latency exceeds the baseline by this factor')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        dataset_options = {key: options[key] for key in
+                           ('hackathons', 'teams', 'members', 'submissions')}
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            dataset = benchmark.seed(**dataset_options)
+            results = benchmark.run(dataset, iterations=options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.print_table(results)
+
+        broken = [f'{result["name"]}: status {result["status"]} '
+                  f'(expected {result["expected_status"]})'
+                  for result in results
+                  if result['status'] != result['expected_status']]
+        if broken:
+            raise CommandError('Unexpected responses:\n' + '\n'.join(broken))
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump({'dataset': dataset_options, 'results': results},
+                          baseline_file, indent=2)
+                baseline_file.write('\n')
+            self.stdout.write(f'Baseline written to {options["baseline"]}')
+            return
+
+        if not os.path.exists(options['baseline']):
+            return
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['dataset'] != dataset_options:
+            self.stderr.write('Dataset differs from the baseline, not comparing.')
+            return
+        failures = benchmark.compare(results, baseline, options['latency_tolerance'])
+        if failures:
+            raise CommandError('Baseline exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Within baseline.'))
+
+    def print_table(self, results):
+        header = f'{"endpoint":<30} {"method":<6} {"status":>6} {"queries":>7} ' \
+                 f'{"warm":>5} {"p50 ms":>8} {"p95 ms":>8} {"bytes":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            self.stdout.write(
+                f'{result["name"]:<30} {result["method"]:<6} {result["status"]:>6} '
+                f'{result["queries"]:>7} {result["warm_queries"]:>5} '
+                f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["bytes"]:>9}')
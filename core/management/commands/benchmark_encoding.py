@@ -0,0 +1,86 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from core import benchmark
+from hackalog import compression
+from hackalog.renderers import ORJSONRenderer
+
+RENDERERS = (('json', JSONRenderer()), ('orjson', ORJSONRenderer()))
+
+
+class Command(BaseCommand):
+    help = ('Measures the time to encode every page of GET '
+            '/hackathons/<slug>/teams/ for a hackathon of --teams teams with '
+            'the json and orjson renderers, and the bytes sent and time taken '
+            'with each compression, in a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=1000)
+        parser.add_argument('--members', type=int, default=3)
+        parser.add_argument('--runs', type=int, default=10,
+                            help='Times every page is encoded')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            dataset = benchmark.seed(hackathons=1, teams=options['teams'],
+                                     members=options['members'], submissions=0)
+            pages = self.get_pages(dataset['Completed']['slug'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f'{options["teams"]} teams in {len(pages)} pages')
+        header = f'{"encoding":<16} {"median ms":>10} {"bytes":>12}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for label, renderer in RENDERERS:
+            rendered, elapsed = self.measure(
+                lambda: [renderer.render(data) for data in pages], options['runs'])
+            self.write(label, elapsed, rendered)
+        for encoding in ('gzip', 'br'):
+            if encoding == 'br' and compression.brotli is None:
+                self.stdout.write(f'{"orjson + br":<16} brotli is not installed')
+                continue
+            compressed, elapsed = self.measure(
+                lambda: [compression.compress(content, encoding) for content in rendered],
+                options['runs'])
+            self.write(f'orjson + {encoding}', elapsed, compressed)
+
+    def get_pages(self, slug):
+        """
+        The data of every page of the team list, as the view returns it.
+        """
+        client = APIClient()
+        pages = []
+        url = f'/hackathons/{slug}/teams/?page_size={settings.API_MAX_PAGE_SIZE}'
+        # Every page is rendered by its view rather than read from the cache
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            while url:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'GET {url} returned {response.status_code}')
+                pages.append(response.data)
+                url = response.data['next']
+        return pages
+
+    def measure(self, encode, runs):
+        """
+        The result of `encode` and the median time it took over `runs` runs.
+        """
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = encode()
+            timings.append(time.perf_counter() - started)
+        return result, statistics.median(timings)
+
+    def write(self, label, elapsed, contents):
+        self.stdout.write(f'{label:<16} {elapsed * 1000:>10.1f} '
+                          f'{sum(len(content) for content in contents):>12}')
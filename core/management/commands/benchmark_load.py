@@ -0,0 +1,149 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from core import benchmark
+
+
+async def asgi_get(application, path, token=None):
+    """
+    Sends a GET request of `path` to the ASGI `application` and returns the
+    status of the response.
+    """
+    path, _, query = path.partition('?')
+    headers = [(b'host', b'testserver')]
+    if token:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path,
+        'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': headers,
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = ('Load tests the hot read endpoints in WSGI mode and in ASGI mode, '
+            'against a database with simulated latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Concurrent requests in ASGI mode')
+        parser.add_argument('--wsgi-workers', type=int, default=4,
+                            help='Sync workers emulated in WSGI mode')
+        parser.add_argument('--db-latency', type=float, default=20,
+                            help='Milliseconds added to every query')
+        parser.add_argument('--connect-latency', type=float, default=30,
+                            help='Milliseconds added to every new connection')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        latency = options['db_latency'] / 1000
+        connect_latency = options['connect_latency'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(connection, **kwargs):
+            time.sleep(connect_latency)
+            connection.execute_wrappers.append(delay)
+
+        try:
+            dataset = benchmark.seed(hackathons=3, teams=20, members=3, submissions=20)
+            requests = self.get_requests(dataset, options['requests'])
+            connection_created.connect(add_delay)
+            # Every request reaches the database
+            with override_settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                results = [
+                    ('wsgi', self.run_wsgi(requests, options['wsgi_workers'])),
+                    ('asgi', self.run_asgi(requests, options['concurrency'])),
+                ]
+        finally:
+            connection_created.disconnect(add_delay)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        header = f'{"mode":<8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for label, (elapsed, latencies) in results:
+            latencies.sort()
+            self.stdout.write(
+                f'{label:<8} {len(latencies) / elapsed:>8.1f} '
+                f'{statistics.median(latencies) * 1000:>8.1f} '
+                f'{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>8.1f}')
+
+    def get_requests(self, dataset, count):
+        completed = dataset['Completed']
+        token = dataset['tokens'][dataset['actor']]
+        # Authenticated, as the anonymous pages of the completed hackathon
+        # are served from snapshots (see core.snapshots)
+        paths = [
+            ('/hackathons/', None),
+            (f'/hackathons/{completed["slug"]}/', token),
+            (f'/hackathons/{completed["slug"]}/teams/?page_size=5', token),
+            (f'/hackathons/{completed["slug"]}/submissions/', token),
+            ('/profile/', token),
+        ]
+        return [paths[i % len(paths)] for i in range(count)]
+
+    def check_response(self, path, status):
+        if status != 200:
+            raise CommandError(f'GET {path} returned {status}')
+
+    def run_wsgi(self, requests, workers):
+        def get(request):
+            path, token = request
+            headers = {'Authorization': 'Token ' + token} if token else None
+            started = time.perf_counter()
+            response = Client().get(path, headers=headers)
+            self.check_response(path, response.status_code)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as executor:
+            latencies = list(executor.map(get, requests))
+        return time.perf_counter() - started, latencies
+
+    def run_asgi(self, requests, concurrency):
+        # Served by the handler ASGI servers call, which runs the sync code
+        # of every request in a thread of its own (AsyncClient shares one
+        # thread between all requests)
+        application = ASGIHandler()
+
+        async def get(semaphore, request):
+            path, token = request
+            async with semaphore:
+                started = time.perf_counter()
+                status = await asgi_get(application, path, token)
+                self.check_response(path, status)
+                return time.perf_counter() - started
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(get(semaphore, request) for request in requests))
+
+        started = time.perf_counter()
+        latencies = asyncio.run(run())
+        return time.perf_counter() - started, latencies
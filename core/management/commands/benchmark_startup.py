@@ -0,0 +1,63 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Code run in a fresh interpreter for each stage, timed from before the
+# first import until the stage is ready.
+STAGES = {
+    'settings': 'from django.conf import settings; settings.INSTALLED_APPS',
+    'django.setup': 'import django; django.setup()',
+    'wsgi application': 'import hackalog.wsgi',
+}
+
+# Peak memory is read from VmHWM, since ru_maxrss survives exec on Linux and
+# would report the memory of this process.
+SCRIPT = '''
+import json, re, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+with open('/proc/self/status') as status:
+    max_rss = int(re.search(r'VmHWM:\\s+(\\d+)', status.read()).group(1))
+print(json.dumps({{'seconds': elapsed, 'max_rss_kb': max_rss}}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Measures the time from the first import until the settings, the '
+            'app registry and the WSGI application are ready, and the peak '
+            'memory of a process, each in fresh interpreters.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10,
+                            help='Fresh interpreters started per stage')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'hackalog.settings')
+        header = f'{"stage":<18} {"median ms":>10} {"min ms":>8} ' \
+                 f'{"process ms":>11} {"max rss MiB":>12}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for stage, code in STAGES.items():
+            ready, process, rss = [], [], []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, '-c', SCRIPT.format(code=code)],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+                process.append(time.perf_counter() - started)
+                if result.returncode:
+                    raise CommandError(f'{stage} failed:\n{result.stderr}')
+                measurement = json.loads(result.stdout.strip().splitlines()[-1])
+                ready.append(measurement['seconds'])
+                rss.append(measurement['max_rss_kb'])
+            self.stdout.write(
+                f'{stage:<18} {statistics.median(ready) * 1000:>10.1f} '
+                f'{min(ready) * 1000:>8.1f} {statistics.median(process) * 1000:>11.1f} '
+                f'{statistics.median(rss) / 1024:>12.1f}')
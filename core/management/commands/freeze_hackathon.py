@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core import snapshots
+from core.models import Hackathon
+
+
+class Command(BaseCommand):
+    help = ('Renders the public detail, team list, submission list and '
+            'leaderboard of a completed hackathon with declared results once, '
+            'and stores them to be served without querying the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug')
+        parser.add_argument('--base-url',
+                            help='Public URL of the API, by default SNAPSHOT_BASE_URL')
+
+    def handle(self, *args, **options):
+        try:
+            hackathon = Hackathon.objects.get(slug=options['slug'])
+        except Hackathon.DoesNotExist:
+            raise CommandError(f'Hackathon "{options["slug"]}" does not exist.')
+        if not snapshots.is_eligible(hackathon):
+            raise CommandError(f'{hackathon.slug} is {hackathon.status.lower()}'
+                               + ('' if hackathon.results_declared else
+                                  ' and its results are not declared')
+                               + ', only completed hackathons with declared '
+                               'results can be frozen.')
+        if not (options['base_url'] or settings.SNAPSHOT_BASE_URL):
+            raise CommandError('Set SNAPSHOT_BASE_URL or --base-url to the public '
+                               'URL of the API, which the links point to.')
+        frozen = snapshots.freeze(hackathon, options['base_url'])
+        size = sum(len(snapshot.content) for snapshot in frozen)
+        self.stdout.write(f'Froze {len(frozen)} responses of {hackathon.slug} '
+                          f'({size / 1024:.1f} KiB gzipped).')
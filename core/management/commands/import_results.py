@@ -0,0 +1,58 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core import results
+from core.models import Hackathon
+
+
+class Command(BaseCommand):
+    help = ('Sets the score and review of submissions from a CSV, XLSX or JSONL '
+            'file with "id", "score" and "review" columns, and declares the '
+            'results of the hackathon.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--hackathon', required=True,
+                            help='Slug of the hackathon the submissions belong to')
+        parser.add_argument('--format', choices=results.FORMATS,
+                            help='Format of the file, by default its extension')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Submissions updated per query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the file without writing anything')
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help='Import the valid rows even if some rows are invalid')
+        parser.add_argument('--no-declare', action='store_true',
+                            help='Do not mark the results of the hackathon as declared')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        try:
+            hackathon = Hackathon.objects.get(slug=options['hackathon'])
+        except Hackathon.DoesNotExist:
+            raise CommandError(f'Hackathon "{options["hackathon"]}" does not exist.')
+
+        declare = not options['no_declare'] and not hackathon.results_declared
+        started = time.perf_counter()
+        try:
+            rows = results.read_rows(options['path'], options['format'])
+            valid, errors = results.import_results(
+                rows, hackathon, batch_size=options['batch_size'],
+                dry_run=options['dry_run'], skip_invalid=options['skip_invalid'],
+                declare=declare)
+        except (results.ResultsFileError, OSError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        for number, message in errors:
+            self.stderr.write(f'Row {number}: {message}')
+        if options['dry_run']:
+            self.stdout.write(f'Dry run: {valid} valid rows, {len(errors)} invalid rows.')
+            return
+        if errors and not options['skip_invalid']:
+            raise CommandError(f'{len(errors)} invalid rows, nothing was imported.')
+
+        self.stdout.write(f'Updated {valid} submissions in {elapsed:.2f}s, '
+                          f'skipped {len(errors)} invalid rows.')
+        if declare:
+            self.stdout.write(f'Results of {hackathon.slug} declared.')
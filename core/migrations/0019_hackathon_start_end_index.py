@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_auto_20210202_1444'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hackathon',
+            index=models.Index(fields=['start', 'end'], name='core_hackathon_start_end'),
+        ),
+    ]
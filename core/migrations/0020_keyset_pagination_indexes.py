@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_hackathon_start_end_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hackathon',
+            index=models.Index(fields=['start', 'id'], name='core_hackathon_start_id'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['hackathon', '-score', 'id'], name='core_submission_score_id'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['hackathon', 'id'], name='core_team_hackathon_id'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['hackathon', '-score', 'time'], name='core_submission_rank'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_hackathons(apps, schema_editor):
+    """
+    Sets the hackathon of every membership and, where a user is in several
+    teams of a hackathon, keeps only the team they lead or else the one they
+    joined first.
+    """
+    Team = apps.get_model('core', 'Team')
+    TeamMembership = apps.get_model('core', 'TeamMembership')
+    TeamMembership.objects.update(hackathon=Subquery(
+        Team.objects.filter(pk=OuterRef('team')).values('hackathon')[:1]))
+
+    duplicated = TeamMembership.objects.values('user', 'hackathon').annotate(
+        count=Count('*')).filter(count__gt=1)
+    changed_teams = set()
+    for duplicate in duplicated:
+        memberships = list(TeamMembership.objects.filter(
+            user=duplicate['user'], hackathon=duplicate['hackathon'],
+        ).select_related('team').order_by('id'))
+        kept = next((membership for membership in memberships
+                     if membership.team.leader_id == membership.user_id),
+                    memberships[0])
+        removed = [membership for membership in memberships if membership != kept]
+        TeamMembership.objects.filter(pk__in=[m.pk for m in removed]).delete()
+        changed_teams.update(membership.team_id for membership in removed)
+
+    members = TeamMembership.objects.filter(
+        team=OuterRef('pk')).order_by().values('team').annotate(
+        count=Count('*')).values('count')
+    Team.objects.filter(pk__in=changed_teams).update(
+        member_count=Coalesce(Subquery(members), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0022_team_member_count'),
+    ]
+
+    operations = [
+        # The implicit through table of Team.members becomes TeamMembership
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TeamMembership',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.team')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'core_team_members',
+                        'unique_together': {('team', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='team',
+                    name='members',
+                    field=models.ManyToManyField(related_name='teams_as_a_member', through='core.TeamMembership', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='teammembership',
+            name='hackathon',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.hackathon'),
+        ),
+        migrations.RunPython(fill_hackathons, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='teammembership',
+            name='hackathon',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.hackathon'),
+        ),
+        migrations.AddConstraint(
+            model_name='teammembership',
+            constraint=models.UniqueConstraint(fields=('user', 'hackathon'), name='core_membership_user_hackathon'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 03:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_team_membership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HackathonSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.TextField()),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('content', models.BinaryField()),
+                ('etag', models.CharField(max_length=34)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('hackathon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.hackathon')),
+            ],
+        ),
+    ]
@@ -1,10 +1,62 @@
 from django.db import models
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Value, When, Window)
+from django.db.models.functions import Coalesce, Rank
 from authentication.models import User
 from django.core.validators import MaxValueValidator
 from django.utils import timezone
 # Create your models here.
 
 
+class HackathonQuerySet(models.QuerySet):
+    """
+    Status of hackathons computed by the database. A hackathon is Upcoming
+    while start > now, Completed once end <= now and Ongoing in between,
+    exactly like Hackathon.status.
+    """
+
+    def with_status(self, now=None):
+        """
+        Annotates `annotated_status`, which Hackathon.status returns instead
+        of recomputing it.
+        """
+        now = now or timezone.now()
+        return self.annotate(annotated_status=Case(
+            When(start__gt=now, then=Value('Upcoming')),
+            When(end__lte=now, then=Value('Completed')),
+            default=Value('Ongoing'),
+            output_field=models.CharField()))
+
+    def filter_status(self, status, now=None):
+        """
+        Hackathons with the given status, as range conditions on the
+        (start, end) index.
+        """
+        now = now or timezone.now()
+        if status == 'Upcoming':
+            return self.filter(start__gt=now)
+        elif status == 'Completed':
+            return self.filter(start__lte=now, end__lte=now)
+        elif status == 'Ongoing':
+            return self.filter(start__lte=now, end__gt=now)
+        raise ValueError(f'Invalid status: {status}')
+
+    def with_user_status(self, user):
+        """
+        Annotates `annotated_user_status`, the status of the hackathon for
+        `user`: 'submitted' once their team made a submission, 'registered'
+        while they are in a team, 'not registered' otherwise.
+        """
+        submitted = Submission.objects.filter(
+            hackathon=OuterRef('pk'), team__teammembership__user=user)
+        registered = TeamMembership.objects.filter(hackathon=OuterRef('pk'), user=user)
+        return self.annotate(annotated_user_status=Case(
+            When(Exists(submitted), then=Value('submitted')),
+            When(Exists(registered), then=Value('registered')),
+            default=Value('not registered'),
+            output_field=models.CharField()))
+
+
 class Hackathon(models.Model):
     """
     A model representing a Hackathon
@@ -20,20 +72,76 @@ class Hackathon(models.Model):
     max_team_size = models.IntegerField(default=10)
     slug = models.SlugField(unique=True)
 
+    objects = HackathonQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start', 'end'], name='core_hackathon_start_end'),
+            # Keyset pagination order of the hackathon list
+            models.Index(fields=['start', 'id'], name='core_hackathon_start_id'),
+        ]
+
     @property
     def status(self):
+        annotated_status = getattr(self, 'annotated_status', None)
+        if annotated_status is not None:
+            return annotated_status
         current_date = timezone.now()
-        if self.start <= current_date and self.end <= current_date:
+        if self.start > current_date:
+            return "Upcoming"
+        elif self.end <= current_date:
             return "Completed"
-        elif self.start <= current_date and self.end >= current_date:
-            return "Ongoing"
         else:
-            return "Upcoming"
+            return "Ongoing"
+
+    def save(self, *args, **kwargs):
+        # The annotated status no longer holds once the dates are changed
+        vars(self).pop('annotated_status', None)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
+def team_detail_prefetches(prefix=''):
+    """
+    Prefetch objects needed to serialize teams with their member and leader
+    profiles (members -> teams -> hackathon) without any per-row queries.
+    `prefix` is the lookup path to the team, e.g. 'team__' from a Submission.
+    """
+    profile_teams = Prefetch(
+        'teams_as_a_member',
+        queryset=Team.objects.select_related('hackathon'),
+        to_attr='prefetched_teams')
+    return [
+        Prefetch(f'{prefix}members',
+                 queryset=User.objects.prefetch_related(profile_teams)),
+        Prefetch(f'{prefix}leader__teams_as_a_member',
+                 queryset=Team.objects.select_related('hackathon'),
+                 to_attr='prefetched_teams'),
+    ]
+
+
+class TeamQuerySet(models.QuerySet):
+
+    def with_details(self):
+        """
+        Teams along with everything TeamDetailSerializer reads.
+        """
+        return self.select_related('hackathon', 'leader').prefetch_related(
+            *team_detail_prefetches())
+
+    def recount_members(self):
+        """
+        Sets member_count of the teams to their number of members, in one
+        UPDATE.
+        """
+        members = TeamMembership.objects.filter(
+            team=OuterRef('pk')).order_by().values('team').annotate(
+            count=Count('*')).values('count')
+        return self.update(member_count=Coalesce(Subquery(members), 0))
+
+
 class Team(models.Model):
     """
     A model representing a participating team.
@@ -44,15 +152,100 @@ class Team(models.Model):
     hackathon = models.ForeignKey(
         Hackathon, on_delete=models.CASCADE, related_name="participating_teams")
     team_id = models.CharField(max_length=16, unique=True)
-    members = models.ManyToManyField(User, related_name="teams_as_a_member")
+    members = models.ManyToManyField(
+        User, through='TeamMembership', related_name="teams_as_a_member")
+    # Kept equal to members.count(): bumped by joins under the size limit
+    # and recounted by core.signals and TeamAdmin when members are changed
+    # otherwise
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TeamQuerySet.as_manager()
 
     class Meta:
         unique_together = ("name", "hackathon")
+        indexes = [
+            # Keyset pagination order of the team list of a hackathon
+            models.Index(fields=['hackathon', 'id'], name='core_team_hackathon_id'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # member_count is only written by UPDATE queries, so that saving an
+        # instance loaded before members changed does not overwrite it
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'member_count']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+class TeamMembership(models.Model):
+    """
+    A member of a team. The hackathon of the team is repeated here so that
+    the database enforces one team per user in every hackathon.
+    """
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    hackathon = models.ForeignKey(Hackathon, on_delete=models.CASCADE)
+
+    class Meta:
+        # The table of the former implicit through model
+        db_table = 'core_team_members'
+        unique_together = ('team', 'user')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'hackathon'],
+                                    name='core_membership_user_hackathon'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} in {self.team}'
+
+
+class SubmissionQuerySet(models.QuerySet):
+    """
+    Leaderboard ranking: by score descending, ties broken by the earlier
+    submission time. Submissions with equal score and time share a rank.
+    """
+
+    def ranked(self):
+        """
+        Submissions annotated with `rank` and `team_name`, best first.
+        The rank is computed over the filtered queryset, so filter by
+        hackathon before calling this.
+        """
+        return self.annotate(
+            rank=Window(Rank(), order_by=[F('score').desc(), F('time').asc()]),
+            team_name=F('team__name'),
+        ).order_by('rank', 'id')
+
+    def with_rank(self):
+        """
+        Submissions annotated with `rank` within their hackathon and
+        `team_name`, without ranking the whole hackathon: the rank is one
+        more than the number of submissions placed before.
+        """
+        ahead = Submission.objects.filter(
+            Q(score__gt=OuterRef('score'))
+            | Q(score=OuterRef('score'), time__lt=OuterRef('time')),
+            hackathon=OuterRef('hackathon'),
+        ).order_by().values('hackathon').annotate(count=Count('*')).values('count')
+        return self.annotate(
+            rank=Coalesce(Subquery(ahead), 0) + 1,
+            team_name=F('team__name'))
+
+    def with_is_member(self, user):
+        """
+        Annotates `is_member`, whether `user` is in the team of the
+        submission.
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_member=Value(False))
+        return self.annotate(is_member=Exists(TeamMembership.objects.filter(
+            team=OuterRef('team'), user=user)))
+
+
 class Submission(models.Model):
     """
     A model representing submission for a hackthon.
@@ -66,5 +259,35 @@ class Submission(models.Model):
     review = models.TextField(blank=True)
     description = models.TextField(default="No description provided")
 
+    objects = SubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Leaderboard order of a hackathon
+            models.Index(fields=['hackathon', '-score', 'time'],
+                         name='core_submission_rank'),
+            # Keyset pagination order of the submission list of a hackathon
+            models.Index(fields=['hackathon', '-score', 'id'],
+                         name='core_submission_score_id'),
+        ]
+
     def __str__(self):
         return f'{self.team.name}\'s Submission'
+
+
+class HackathonSnapshot(models.Model):
+    """
+    A public GET response of a completed hackathon with declared results,
+    stored gzipped by core.snapshots to be served without the ORM.
+    """
+    hackathon = models.ForeignKey(
+        Hackathon, on_delete=models.CASCADE, related_name='snapshots')
+    url = models.TextField()
+    # SHA-256 of the path and query in `url`, which snapshots are looked up by
+    key = models.CharField(max_length=64, unique=True)
+    content = models.BinaryField()
+    etag = models.CharField(max_length=34)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
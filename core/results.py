@@ -0,0 +1,208 @@
+"""
+Bulk import of submission scores and reviews.
+
+Rows are read lazily from CSV, XLSX or JSONL files, validated against
+Submission and written with one UPDATE ... FROM (VALUES ...) per batch
+inside a single transaction. See `python manage.py import_results --help`.
+"""
+import csv
+import json
+import os
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from . import cache, snapshots
+from .models import Submission
+
+FORMATS = ('csv', 'xlsx', 'jsonl')
+
+
+class ResultsFileError(Exception):
+    """
+    Raised when a results file cannot be read at all.
+    """
+
+
+def _normalize(row):
+    return {str(key).strip().lower(): value
+            for key, value in row.items() if key is not None}
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as results_file:
+        reader = csv.DictReader(results_file)
+        for row in reader:
+            yield reader.line_num, _normalize(row)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as results_file:
+        for number, line in enumerate(results_file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, _normalize(row) if isinstance(row, dict) else None
+
+
+def read_xlsx(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ResultsFileError('Reading XLSX files requires openpyxl.')
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        for number, values in enumerate(rows, 2):
+            if any(value is not None for value in values):
+                yield number, _normalize(dict(zip(header, values)))
+    finally:
+        workbook.close()
+
+
+READERS = {'csv': read_csv, 'xlsx': read_xlsx, 'jsonl': read_jsonl}
+
+
+def read_rows(path, format=None):
+    """
+    Yields (row number, row) of a results file, where a row is a dict of
+    lower-cased column names to values, or None if it could not be parsed.
+    The format defaults to the file extension.
+    """
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip('.').lower()
+    if format not in READERS:
+        raise ResultsFileError(
+            f'Unknown format "{format}", expected one of {", ".join(FORMATS)}.')
+    return READERS[format](path)
+
+
+def clean_row(row):
+    """
+    Returns the submission id, score and review of a row.
+    Raises ValidationError naming the invalid columns.
+    """
+    if row is None:
+        raise ValidationError('Row could not be parsed.')
+    errors = {}
+    try:
+        id = int(row.get('id'))
+        if id < 0 or id != float(row.get('id')):
+            raise ValueError
+    except (TypeError, ValueError):
+        errors['id'] = ['A submission id is required.']
+
+    # A blank score means the submission was not scored
+    score = row.get('score')
+    if score is None or str(score).strip() == '':
+        score = 0
+    try:
+        score = Submission._meta.get_field('score').clean(score, None)
+        if score < 0:
+            raise ValidationError('Ensure this value is greater than or equal to 0.')
+    except ValidationError as error:
+        errors['score'] = error.messages
+
+    review = row.get('review')
+    review = '' if review is None else str(review)
+    if errors:
+        raise ValidationError(errors)
+    return id, score, review
+
+
+def _format_error(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}'
+                         for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def _write_batch(batch, hackathon, errors, hackathon_ids):
+    """
+    Updates the submissions of `batch`, a dict of id -> (row number, score,
+    review), and adds their hackathons to `hackathon_ids`. Returns the
+    number of updated submissions.
+    """
+    submissions = Submission.objects.filter(id__in=batch).only('id', 'hackathon_id')
+    found = {submission.id: submission for submission in submissions}
+    updated = []
+    for id, (number, score, review) in batch.items():
+        submission = found.get(id)
+        if submission is None:
+            errors.append((number, f'id: Submission {id} does not exist.'))
+        elif hackathon is not None and submission.hackathon_id != hackathon.id:
+            errors.append((number, f'id: Submission {id} belongs to another hackathon.'))
+        else:
+            updated.append((id, score, review))
+            hackathon_ids.add(submission.hackathon_id)
+    if updated:
+        _update(updated)
+    return len(updated)
+
+
+def _update(values):
+    """
+    Sets the score and review of (id, score, review) tuples in one query.
+    bulk_update builds a CASE expression per row, which takes seconds of
+    Python time for a few thousand rows. The submission time is deliberately
+    left untouched.
+    """
+    table = connection.ops.quote_name(Submission._meta.db_table)
+    rows = ', '.join(['(%s, %s, %s)'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH results (id, score, review) AS (VALUES {rows}) '
+            f'UPDATE {table} SET score = results.score, review = results.review '
+            f'FROM results WHERE {table}.id = results.id',
+            [value for row in values for value in row])
+
+
+def import_results(rows, hackathon=None, batch_size=1000, dry_run=False,
+                   skip_invalid=False, declare=False):
+    """
+    Sets the score and review of the submissions in `rows`, as yielded by
+    `read_rows`. With `hackathon` every submission must belong to it, and
+    with `declare` its results are declared in the same transaction.
+
+    Returns (number of valid rows, list of (row number, error)).
+    Nothing is written in a dry run, nor if there is any error unless
+    `skip_invalid` is set.
+    """
+    errors = []
+    seen = {}
+    updated = 0
+    hackathon_ids = set()
+    with transaction.atomic():
+        batch = {}
+        for number, row in rows:
+            try:
+                id, score, review = clean_row(row)
+            except ValidationError as error:
+                errors.append((number, _format_error(error)))
+                continue
+            if id in seen:
+                errors.append((number, f'id: Submission {id} is repeated from row {seen[id]}.'))
+                continue
+            seen[id] = number
+            batch[id] = (number, score, review)
+            if len(batch) >= batch_size:
+                updated += _write_batch(batch, hackathon, errors, hackathon_ids)
+                batch = {}
+        if batch:
+            updated += _write_batch(batch, hackathon, errors, hackathon_ids)
+
+        if dry_run or (errors and not skip_invalid):
+            transaction.set_rollback(True)
+        elif declare and not hackathon.results_declared:
+            # Its post_save signals invalidate the hackathon, the only one
+            # of hackathon_ids
+            hackathon.results_declared = True
+            hackathon.save(update_fields=['results_declared'])
+        elif updated:
+            # The raw UPDATE sends no post_save signals
+            transaction.on_commit(cache.invalidate)
+            snapshots.invalidate(hackathon_ids)
+    errors.sort()
+    return updated, errors
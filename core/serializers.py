@@ -1,20 +1,25 @@
 from rest_framework import serializers, exceptions
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from .models import Hackathon, Team, Submission
+from . import cache
+from .fieldsets import SparseFieldsMixin, nested
+from .models import Hackathon, Team, TeamMembership, Submission
 from authentication.models import User
 from authentication import serializers as auth_serializer
+from hackalog.instrumentation import TimedSerializerMixin
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """
     This Serailizer serializes Team objects but it does not include members and details. 
     """
     hackathon = serializers.SerializerMethodField()
+    included_as = ('teams', 'team_id')
 
     def get_hackathon(self, obj):
-        serializer = HackathonSerializer(obj.hackathon)
-        return serializer.data
+        return nested(self, 'hackathon', HackathonSerializer, obj.hackathon)
 
     class Meta:
         model = Team
@@ -30,55 +35,47 @@ class TeamDetailSerializer(TeamSerializer):
     leader = serializers.SerializerMethodField()
 
     def get_members(self, obj):
-        serializer = auth_serializer.ProfileSerializer(obj.members, many=True)
-        return serializer.data
+        return nested(self, 'members', auth_serializer.ProfileSerializer,
+                      obj.members, many=True)
 
     def get_leader(self, obj):
-        serializer = auth_serializer.ProfileSerializer(obj.leader)
-        return serializer.data
+        return nested(self, 'leader', auth_serializer.ProfileSerializer, obj.leader)
 
     class Meta:
         model = Team
         fields = ('id', 'name', 'hackathon', 'team_id', 'members', 'leader')
 
 
-class TeamCreateSerializer(serializers.ModelSerializer):
+class TeamCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     def validate(self, attrs):
-        name = attrs['name']
         hackathon_slug = self.context['kwargs']['slug']
-        user = self.context['request'].user
         try:
-            hackathon = Hackathon.objects.get(slug=hackathon_slug)
+            attrs['hackathon'] = Hackathon.objects.get(slug=hackathon_slug)
         except Hackathon.DoesNotExist:
             raise exceptions.NotFound(detail="Hackathon does not exist!")
-        try:
-            team = Team.objects.get(hackathon=hackathon, members=user)
-        except:
-            pass
-        else:
-            raise exceptions.ValidationError(
-                detail="You are already part of a team in this hackathon.")
-        try:
-            team = Team.objects.get(hackathon=hackathon, name=name)
-        except:
-            pass
-        else:
-            raise exceptions.ValidationError(
-                detail="Team with this name already exists in the Hackathon!")
         return attrs
 
     def save(self):
+        """
+        Creates the team with the user as its leader and only member. The
+        unique constraints on team names and memberships reject duplicates.
+        """
         data = self.validated_data
         user = self.context['request'].user
-        leader = user
-        members = [user]
-        hackathon_slug = self.context['kwargs']['slug']
-        hackathon = Hackathon.objects.get(slug=hackathon_slug)
-        team = Team.objects.create(
-            name=data['name'], hackathon=hackathon, leader=leader, team_id=get_random_string(16))
-        team.members.set(members)
-        team.save()
+        hackathon = data['hackathon']
+        try:
+            with transaction.atomic():
+                team = Team.objects.create(
+                    name=data['name'], hackathon=hackathon, leader=user,
+                    team_id=get_random_string(16), member_count=1)
+                TeamMembership.objects.create(team=team, user=user, hackathon=hackathon)
+        except IntegrityError:
+            if TeamMembership.objects.filter(hackathon=hackathon, user=user).exists():
+                raise exceptions.ValidationError(
+                    detail="You are already part of a team in this hackathon.")
+            raise exceptions.ValidationError(
+                detail="Team with this name already exists in the Hackathon!")
         return team
 
     class Meta:
@@ -89,33 +86,45 @@ class TeamCreateSerializer(serializers.ModelSerializer):
 class JoinTeamSerializer(serializers.Serializer):
 
     def join_team(self):
+        """
+        Adds the user to the team in one transaction. The team row is locked
+        and member_count is only bumped while it is below max_team_size, so
+        concurrent joins can never overfill a team. The unique constraints
+        of TeamMembership reject users already in a team of the hackathon.
+        """
         hackathon_slug = self.context['kwargs']['slug']
         team_id = self.context['kwargs']['team_id']
-        try:
-            hackathon = Hackathon.objects.get(slug=hackathon_slug)
-            team = Team.objects.get(team_id=team_id, hackathon=hackathon)
-        except Hackathon.DoesNotExist:
-            raise exceptions.NotFound(detail="Hackathon does not exist!")
-        except Team.DoesNotExist:
-            raise exceptions.NotFound(detail="Team does not exist!")
         user = self.context['request'].user
-        if team.members.count() >= hackathon.max_team_size:
-            raise exceptions.ValidationError(detail="Team is full!")
-        team_qs = Team.objects.filter(hackathon=hackathon, members=user)
-        if team_qs.exists():
-            print('team_qs =', team_qs)
-            raise exceptions.ValidationError(
-                detail="You are already part of some team in this hackathon.")
-        else:
-            members = team.members
-            if user in members.all():
+        team = None
+        try:
+            with transaction.atomic():
+                try:
+                    team = Team.objects.select_for_update(of=('self',)).select_related(
+                        'hackathon').get(team_id=team_id, hackathon__slug=hackathon_slug)
+                except Team.DoesNotExist:
+                    if not Hackathon.objects.filter(slug=hackathon_slug).exists():
+                        raise exceptions.NotFound(detail="Hackathon does not exist!")
+                    raise exceptions.NotFound(detail="Team does not exist!")
+                full = not Team.objects.filter(
+                    pk=team.pk, member_count__lt=team.hackathon.max_team_size,
+                ).update(member_count=F('member_count') + 1)
+                if full:
+                    raise exceptions.ValidationError(detail="Team is full!")
+                # Added directly, as member_count is already up to date
+                TeamMembership.objects.create(
+                    team=team, user=user, hackathon_id=team.hackathon_id)
+        except IntegrityError:
+            if TeamMembership.objects.filter(team=team, user=user).exists():
                 raise exceptions.ValidationError(
                     detail="You are already in the team!")
-            members.add(user)
+            raise exceptions.ValidationError(
+                detail="You are already part of some team in this hackathon.")
+        transaction.on_commit(cache.invalidate)
 
 
-class HackathonSerializer(serializers.ModelSerializer):
-    status = serializers.CharField()
+class HackathonSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    status = serializers.CharField(read_only=True)
+    included_as = ('hackathons', 'slug')
 
     def validate_end(self, end):
         if end < timezone.now():
@@ -128,7 +137,10 @@ class HackathonSerializer(serializers.ModelSerializer):
         return start
 
     def validate(self, attrs):
-        if attrs['start'] > attrs['end']:
+        # Partial updates may change only one of the dates
+        start = attrs.get('start', getattr(self.instance, 'start', None))
+        end = attrs.get('end', getattr(self.instance, 'end', None))
+        if start > end:
             raise serializers.ValidationError('Event ends before starting')
         return attrs
 
@@ -148,32 +160,17 @@ class HackathonDetailSerializer(HackathonSerializer):
         request = self.context['request']
         if not request.auth:
             return False
-        teams = Team.objects.filter(members=request.user, hackathon=obj)
-        submissions = []
-        for team in teams:
-            submissions.extend(
-                Submission.objects.filter(hackathon=obj, team=team)
-            )
-        if not teams.count():
-            return 'not registered'
-        elif not len(submissions):
-            return 'registered'
-        return 'submitted'
-
-
-class SubmissionsSerializer(serializers.ModelSerializer):
-    teamName = serializers.SerializerMethodField('get_teamName')
-
-    def get_teamName(self, obj):
-        '''
-        Serializer Field to show team name 
-        without the need of full team details
-        '''
-        try:
-            team = Team.objects.get(pk=obj.team_id)
-        except Team.DoesNotExist:
-            raise exceptions.ValidationError(detail='Team does not exists.')
-        return team.name
+        user_status = getattr(obj, 'annotated_user_status', None)
+        if user_status is None:
+            user_status = Hackathon.objects.filter(pk=obj.pk).with_user_status(
+                request.user).values_list('annotated_user_status', flat=True).get()
+        return user_status
+
+
+class SubmissionsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Team name without the full team details, read from the
+    # select_related team of HackathonSubmissionView's queryset
+    teamName = serializers.CharField(source='team.name', read_only=True)
 
     class Meta:
         model = Submission
@@ -185,6 +182,20 @@ class SubmissionsSerializer(serializers.ModelSerializer):
         return score
 
 
+class LeaderboardSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializes submissions annotated by SubmissionQuerySet.ranked() or
+    with_rank().
+    """
+    rank = serializers.IntegerField(read_only=True)
+    teamName = serializers.CharField(source='team_name', read_only=True)
+
+    class Meta:
+        model = Submission
+        fields = ('rank', 'id', 'teamName', 'title',
+                  'submission_url', 'score', 'time')
+
+
 class MemberExitSerializer(serializers.Serializer):
 
     def exit_team(self):
@@ -210,23 +221,20 @@ class MemberExitSerializer(serializers.Serializer):
             if member not in members.all():
                 raise exceptions.ValidationError(detail='Already not in team')
             members.remove(member)
-            team.save()
         else:
             raise exceptions.PermissionDenied(
                 'You are not allowed to perform this operation.')
 
 
-class SubmissionRUDSerializer(serializers.ModelSerializer):
+class SubmissionRUDSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     hackathon = serializers.SerializerMethodField()
     team = serializers.SerializerMethodField()
 
     def get_hackathon(self, obj):
-        serializer = HackathonSerializer(obj.hackathon)
-        return serializer.data
+        return nested(self, 'hackathon', HackathonSerializer, obj.hackathon)
 
     def get_team(self, obj):
-        serializer = TeamDetailSerializer(obj.team)
-        return serializer.data
+        return nested(self, 'team', TeamDetailSerializer, obj.team)
 
     class Meta:
         model = Submission
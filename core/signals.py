@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from . import cache, snapshots
+from .models import Hackathon, Team, TeamMembership, Submission
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Hackathon)
+@receiver([post_save, post_delete], sender=Team)
+@receiver([post_save, post_delete], sender=Submission)
+def invalidate_hackathon_cache(sender, **kwargs):
+    cache.invalidate()
+
+
+def members(**filters):
+    return TeamMembership.objects.filter(**filters).values_list('user_id', flat=True)
+
+
+# Frozen teams embed the profiles of their members, along with the teams
+# and hackathons of those members, so the snapshots of every hackathon a
+# changed user, team or hackathon is reachable from are deleted.
+
+@receiver(post_save, sender=Hackathon)
+def invalidate_hackathon_snapshots(sender, instance, created, **kwargs):
+    if not created:
+        snapshots.invalidate([instance.pk], members(hackathon=instance.pk))
+
+
+@receiver(pre_delete, sender=Hackathon)
+def invalidate_deleted_hackathon_snapshots(sender, instance, **kwargs):
+    # Its memberships are deleted with it
+    snapshots.invalidate(users=list(members(hackathon=instance.pk)))
+
+
+@receiver(post_save, sender=Team)
+def invalidate_team_snapshots(sender, instance, created, **kwargs):
+    if created:
+        if not is_known_ineligible(instance):
+            snapshots.invalidate([instance.hackathon_id])
+    else:
+        snapshots.invalidate([instance.hackathon_id], members(team=instance.pk))
+
+
+@receiver(pre_delete, sender=Team)
+def invalidate_deleted_team_snapshots(sender, instance, **kwargs):
+    snapshots.invalidate([instance.hackathon_id], list(members(team=instance.pk)))
+
+
+# Memberships removed through Team.members are handled by
+# recount_team_members, and a post_delete receiver would keep them from
+# being deleted in a single query
+@receiver(post_save, sender=TeamMembership)
+def invalidate_membership_snapshots(sender, instance, **kwargs):
+    snapshots.invalidate([instance.hackathon_id], [instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def invalidate_submission_snapshots(sender, instance, **kwargs):
+    if not is_known_ineligible(instance):
+        snapshots.invalidate([instance.hackathon_id])
+
+
+def is_known_ineligible(instance):
+    """
+    Whether the hackathon of `instance` is loaded and cannot have snapshots.
+    """
+    field = instance._meta.get_field('hackathon')
+    return field.is_cached(instance) and not snapshots.is_eligible(instance.hackathon)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_snapshots(sender, instance, created, **kwargs):
+    if not created:
+        snapshots.invalidate(users=[instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_deleted_user_snapshots(sender, instance, **kwargs):
+    # Their memberships are deleted with them, without an m2m_changed signal
+    memberships = list(TeamMembership.objects.filter(
+        user=instance).values_list('team_id', 'hackathon_id'))
+    instance._deleted_team_pks = [team for team, _ in memberships]
+    snapshots.invalidate([hackathon for _, hackathon in memberships])
+
+
+@receiver(post_delete, sender=User)
+def recount_deleted_user_teams(sender, instance, **kwargs):
+    teams = instance.__dict__.pop('_deleted_team_pks', None)
+    if teams:
+        Team.objects.filter(pk__in=teams).recount_members()
+
+
+@receiver(m2m_changed, sender=TeamMembership)
+def recount_team_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The members or teams are unknown once the rows are gone
+        instance._cleared_pks = list(
+            instance.teams_as_a_member.values_list('pk', flat=True) if reverse
+            else members(team=instance.pk))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_pks', [])
+    if not reverse:
+        teams = Team.objects.filter(pk=instance.pk)
+    else:
+        teams = Team.objects.filter(pk__in=pk_set)
+    teams.recount_members()
+    cache.invalidate()
+    if not reverse:
+        snapshots.invalidate([instance.hackathon_id], list(pk_set))
+    else:
+        snapshots.invalidate(list(teams.values_list('hackathon_id', flat=True)),
+                             [instance.pk])
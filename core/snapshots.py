@@ -0,0 +1,270 @@
+"""
+Read snapshots of completed hackathons.
+
+Once a hackathon is Completed and its results are declared, its public data
+rarely changes. The anonymous JSON responses of its detail, team and
+submission list pages and leaderboard are then rendered once, with links
+under settings.SNAPSHOT_BASE_URL, and stored gzipped in HackathonSnapshot
+by their path and query. SnapshotMixin answers anonymous JSON GET requests
+for those URLs with the stored bytes, without querying the models.
+
+Snapshots are off unless settings.SNAPSHOT_BASE_URL is set, so that
+their links never point to another host. Only canonical URLs are stored: their query has no other parameter than
+the ones the view reads (`snapshot_params`), each valid and given once,
+and is normalized. Other URLs, and the URLs of a hackathon which already
+has settings.SNAPSHOT_MAX_PER_HACKATHON snapshots, are served live.
+
+A snapshot is rendered the first time its URL is requested, or ahead of
+time for every page by `freeze`. Frozen teams embed the profiles of their
+members, with the teams and hackathons those members belong to, so changes
+to any of them delete the snapshots depending on them once they are
+committed (see core.signals).
+"""
+import gzip
+import hashlib
+import re
+from urllib.parse import urlencode, urlsplit
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from . import cache
+from .fieldsets import split
+from .models import Hackathon, HackathonSnapshot, TeamMembership
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+# META key of the requests snapshots are rendered with
+RENDERING = 'core.snapshots.rendering'
+
+
+def is_eligible(hackathon):
+    return hackathon.results_declared and hackathon.status == 'Completed'
+
+
+def snapshot_paths(hackathon):
+    """
+    The first page of every frozen endpoint of `hackathon`. Further pages
+    are followed through their `next` links.
+    """
+    return [f'/hackathons/{hackathon.slug}/{endpoint}'
+            for endpoint in ('', 'teams/', 'submissions/', 'leaderboard/')]
+
+
+def bounded_number(value):
+    """
+    `value` normalized if it is a number between 1 and API_MAX_PAGE_SIZE,
+    None otherwise.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    if not 1 <= number <= settings.API_MAX_PAGE_SIZE:
+        return None
+    return str(number)
+
+
+def field_list(value):
+    return ','.join(sorted(split(value)))
+
+
+# Normalizers of the query parameters of the snapshot views
+PAGE_PARAMS = {'cursor': str, 'page_size': bounded_number}
+FIELDSET_PARAMS = {'fields': field_list, 'expand': field_list}
+
+
+def canonical_path(request, params):
+    """
+    The path of `request` with its query sorted and normalized by `params`,
+    a dict of parameter names to functions returning the normalized value
+    or None if it is invalid. None if the query has any other parameter,
+    or any parameter more than once.
+    """
+    query = []
+    for name, values in request.GET.lists():
+        normalize = params.get(name)
+        if normalize is None or len(values) != 1:
+            return None
+        value = normalize(values[0])
+        if value is None:
+            return None
+        query.append((name, value))
+    return request.path + (f'?{urlencode(sorted(query))}' if query else '')
+
+
+def snapshot_key(path):
+    return hashlib.sha256(path.encode()).hexdigest()
+
+
+def full_path(url):
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def render(hackathon, path, base_url=None):
+    """
+    The snapshot of `path`, rendered as the response of its view to an
+    anonymous GET request of `base_url` + `path`, along with that response.
+    The snapshot is None unless the response is successful.
+    """
+    from django.test import RequestFactory
+    parts = urlsplit((base_url or settings.SNAPSHOT_BASE_URL).rstrip('/') + path)
+    request = RequestFactory().get(
+        path, secure=parts.scheme == 'https', HTTP_HOST=parts.netloc,
+        **{RENDERING: True})
+    match = resolve(parts.path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        return None, response
+    content = response.content
+    return HackathonSnapshot(
+        hackathon=hackathon, url=path, key=snapshot_key(path),
+        content=gzip.compress(content),
+        etag='"%s"' % hashlib.md5(content).hexdigest()), response
+
+
+def freeze(hackathon, base_url=None):
+    """
+    Renders and stores the snapshots of every page of `hackathon`,
+    replacing any older ones. Returns the new HackathonSnapshot objects.
+    """
+    snapshots = []
+    with transaction.atomic():
+        HackathonSnapshot.objects.filter(hackathon=hackathon).delete()
+        for path in snapshot_paths(hackathon):
+            while path:
+                snapshot, response = render(hackathon, path, base_url)
+                if snapshot is None:
+                    break
+                snapshots.append(snapshot)
+                data = getattr(response, 'data', None)
+                next_url = data.get('next') if isinstance(data, dict) else None
+                path = full_path(next_url) if next_url else None
+        HackathonSnapshot.objects.bulk_create(snapshots)
+        transaction.on_commit(cache.invalidate)
+    return snapshots
+
+
+def invalidate(hackathon_ids=(), users=None):
+    """
+    Deletes, once the transaction commits, the snapshots of `hackathon_ids`
+    and of the hackathons `users` are members of, which embed their
+    profiles. `users` is a list of user ids or a query of them, evaluated
+    after the commit.
+    """
+    if not hackathon_ids and users is None:
+        return
+
+    def delete():
+        # The cache version is bumped first, so that snapshots rendered
+        # before the commit are not kept by get_snapshot
+        cache.invalidate()
+        condition = Q(hackathon_id__in=list(hackathon_ids))
+        if users is not None:
+            condition |= Q(hackathon_id__in=TeamMembership.objects.filter(
+                user_id__in=users).values('hackathon_id'))
+        HackathonSnapshot.objects.filter(condition).delete()
+
+    transaction.on_commit(delete)
+
+
+def store(hackathon, path, version):
+    """
+    Renders and stores the snapshot of `path`, a page of `hackathon`.
+    Returns its content and etag, or {} if the page is not successful.
+    """
+    snapshot, _ = render(hackathon, path)
+    if snapshot is None:
+        return {}
+    # Concurrent misses render the same page
+    HackathonSnapshot.objects.bulk_create([snapshot], ignore_conflicts=True)
+    if cache.get_version() != version:
+        # Data changed while rendering, and may have been committed after
+        # it was read (see invalidate)
+        HackathonSnapshot.objects.filter(key=snapshot.key).delete()
+    return {'content': snapshot.content, 'etag': snapshot.etag}
+
+
+def get_snapshot(slug, path):
+    """
+    The content and etag of the snapshot of `path`, a page of the hackathon
+    `slug`, None if it has no snapshot. The snapshot is rendered and stored
+    if the hackathon is eligible. Lookups, including misses, are cached
+    until the next invalidation.
+    """
+    version = cache.get_version()
+    key = snapshot_key(path)
+    cache_key = f'hackathons:{version}:snapshot:{key}'
+    snapshot = django_cache.get(cache_key)
+    if snapshot is not None:
+        return snapshot or None
+
+    snapshots = HackathonSnapshot.objects.filter(hackathon=OuterRef('pk'))
+    snapshot = snapshots.filter(key=key)
+    hackathon = Hackathon.objects.filter(slug=slug).annotate(
+        snapshot_content=Subquery(snapshot.values('content')),
+        snapshot_etag=Subquery(snapshot.values('etag')),
+        snapshot_count=Subquery(snapshots.order_by().values('hackathon').annotate(
+            count=Count('pk')).values('count'))).first()
+    snapshot = {}
+    if hackathon is not None and is_eligible(hackathon):
+        if hackathon.snapshot_etag is not None:
+            snapshot = {'content': bytes(hackathon.snapshot_content),
+                        'etag': hackathon.snapshot_etag}
+        elif (hackathon.snapshot_count or 0) < settings.SNAPSHOT_MAX_PER_HACKATHON:
+            snapshot = store(hackathon, path, version)
+    django_cache.set(cache_key, snapshot, settings.HACKATHON_CACHE_TIMEOUT)
+    return snapshot or None
+
+
+def snapshot_response(request, slug, path):
+    """
+    The snapshot of `path`, the canonical path of `request`, gzipped if the
+    client accepts it, or None if there is no snapshot.
+    """
+    snapshot = get_snapshot(slug, path)
+    if snapshot is None:
+        return None
+    response = get_conditional_response(request, etag=snapshot['etag'])
+    if response is None:
+        if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = HttpResponse(snapshot['content'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(snapshot['content']),
+                                    content_type='application/json')
+    if response.get('Content-Encoding') == 'gzip':
+        # The gzipped content differs from the one the strong ETag names,
+        # as in hackalog.compression
+        response['ETag'] = 'W/' + snapshot['etag']
+    else:
+        response['ETag'] = snapshot['etag']
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class SnapshotMixin:
+    """
+    Serves anonymous JSON GET requests of canonical URLs from the snapshot
+    of their path, if the hackathon `slug` of the view has one.
+    `snapshot_params` are the query parameters the view reads, with their
+    normalizers (see canonical_path).
+    """
+    snapshot_params = {}
+
+    def get(self, request, *args, **kwargs):
+        if (settings.SNAPSHOT_BASE_URL and not request.user.is_authenticated
+                and not request.META.get(RENDERING)
+                and request.accepted_renderer.format == 'json'):
+            path = canonical_path(request, self.snapshot_params)
+            if path is not None:
+                response = snapshot_response(request, kwargs['slug'], path)
+                if response is not None:
+                    return response
+        return super().get(request, *args, **kwargs)
@@ -1,3 +1,1242 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib import admin
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from authentication.models import User
+from hackalog import coalescing, compression, instrumentation, throttling
+from hackalog.renderers import ORJSONParser, ORJSONRenderer
+from . import benchmark, results
+from .admin import TeamsPageAdmin
+from .management.commands.benchmark_load import asgi_get
+from .models import Hackathon, HackathonSnapshot, Team, TeamMembership, Submission
+from .pagination import SubmissionPagination, TeamPagination
+from .serializers import HackathonDetailSerializer, TeamSerializer
 
-# Create your tests here.
+
+def create_hackathon(slug, start_offset=-1, end_offset=1, **kwargs):
+    now = timezone.now()
+    return Hackathon.objects.create(
+        title=slug, slug=slug,
+        start=now + timedelta(days=start_offset),
+        end=now + timedelta(days=end_offset), **kwargs)
+
+
+def create_user(uid):
+    return User.objects.create(uid=uid, username=uid, name=uid)
+
+
+def create_profile(uid):
+    return User.objects.create(
+        uid=uid, username=uid, name=uid, email=f'{uid}@example.com',
+        college='college', github_handle=uid, bio='bio', interests='interests')
+
+
+def create_teams(hackathon, count, members_per_team=3):
+    teams = []
+    offset = hackathon.participating_teams.count()
+    for i in range(offset, offset + count):
+        users = [create_user(f'{hackathon.slug}-{i}-{j}')
+                 for j in range(members_per_team)]
+        team = Team.objects.create(
+            name=f'team-{i}', hackathon=hackathon, leader=users[0],
+            team_id=f'{hackathon.slug[:8]}{i:08d}')
+        team.members.set(users, through_defaults={'hackathon': hackathon})
+        teams.append(team)
+    return teams
+
+
+class HackathonTeamViewTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon')
+        # Members also belong to teams of another hackathon, so the nested
+        # profile teams are not all the same object.
+        self.other = create_hackathon('other')
+
+    def get_teams(self):
+        return self.client.get(f'/hackathons/{self.hackathon.slug}/teams/')
+
+    def test_team_list_query_count_is_constant(self):
+        create_teams(self.hackathon, 2)
+        # snapshot lookup, hackathon, teams (with hackathon and leader),
+        # members, members' teams and leaders' teams
+        with self.assertNumQueries(6):
+            response = self.get_teams()
+        self.assertEqual(len(response.data['results']), 2)
+
+        teams = create_teams(self.hackathon, 10)
+        for team in teams:
+            other_team = Team.objects.create(
+                name=team.name, hackathon=self.other, leader=team.leader,
+                team_id='o' + team.team_id[1:])
+            other_team.members.set(team.members.all(),
+                                   through_defaults={'hackathon': self.other})
+        with self.assertNumQueries(6):
+            response = self.get_teams()
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_team_list_payload(self):
+        team, = create_teams(self.hackathon, 1, members_per_team=2)
+        response = self.get_teams()
+        data = response.data['results'][0]
+        self.assertEqual(data['team_id'], team.team_id)
+        self.assertEqual(data['hackathon']['slug'], self.hackathon.slug)
+        self.assertEqual(data['leader']['username'], team.leader.username)
+        self.assertEqual(
+            sorted(member['username'] for member in data['members']),
+            sorted(team.members.values_list('username', flat=True)))
+        member_teams = data['members'][0]['teams']
+        self.assertEqual(len(member_teams), 1)
+        self.assertEqual(member_teams[0]['hackathon']['slug'],
+                         self.hackathon.slug)
+
+
+class BenchmarkTests(APITestCase):
+
+    def test_every_endpoint_responds_as_expected(self):
+        dataset = benchmark.seed(hackathons=3, teams=3, members=2, submissions=2)
+        results = benchmark.run(dataset, iterations=1)
+        for result in results:
+            self.assertEqual(result['status'], result['expected_status'],
+                             result['name'])
+
+    def test_compare_reports_extra_queries(self):
+        baseline = {'results': [{'name': 'team list', 'queries': 5,
+                                 'warm_queries': 5, 'p95_ms': 10}]}
+        result = {'name': 'team list', 'queries': 6, 'warm_queries': 5,
+                  'p95_ms': 100}
+        self.assertEqual(len(benchmark.compare([result], baseline)), 1)
+        self.assertEqual(len(benchmark.compare([result], baseline, 2)), 2)
+
+
+class HackathonStatusTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(microsecond=0)
+        self.hackathon = Hackathon.objects.create(
+            title='hackathon', slug='hackathon', start=self.now,
+            end=self.now + timedelta(hours=1))
+
+    def assertStatusAt(self, instant, expected):
+        with mock.patch('django.utils.timezone.now', return_value=instant):
+            self.assertEqual(self.hackathon.status, expected)
+            annotated = Hackathon.objects.with_status().get()
+            self.assertEqual(annotated.status, expected)
+            for status in ('Upcoming', 'Ongoing', 'Completed'):
+                self.assertEqual(
+                    Hackathon.objects.filter_status(status).exists(),
+                    status == expected)
+            response = self.client.get(
+                '/hackathons/', {'query': expected.lower()})
+            self.assertEqual(
+                [hackathon['slug'] for hackathon in response.data['results']],
+                ['hackathon'])
+            self.assertEqual(response.data['results'][0]['status'], expected)
+
+    def test_status_at_boundaries(self):
+        second = timedelta(seconds=1)
+        self.assertStatusAt(self.now - second, 'Upcoming')
+        self.assertStatusAt(self.now, 'Ongoing')
+        self.assertStatusAt(self.now + timedelta(minutes=30), 'Ongoing')
+        self.assertStatusAt(self.hackathon.end - second, 'Ongoing')
+        self.assertStatusAt(self.hackathon.end, 'Completed')
+        self.assertStatusAt(self.hackathon.end + second, 'Completed')
+
+    def test_invalid_query(self):
+        response = self.client.get('/hackathons/', {'query': 'past'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HackathonCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.hackathon = create_hackathon('hackathon', 1, 2)
+
+    def test_list_is_served_from_cache(self):
+        self.client.get('/hackathons/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/hackathons/')
+        self.assertEqual(response.data['results'][0]['slug'], 'hackathon')
+        # Different query parameters are cached separately
+        with self.assertNumQueries(2):
+            self.client.get('/hackathons/', {'query': 'upcoming'})
+
+    def test_saves_invalidate_cache(self):
+        self.client.get(f'/hackathons/{self.hackathon.slug}/')
+        self.hackathon.tagline = 'changed'
+        self.hackathon.save()
+        response = self.client.get(f'/hackathons/{self.hackathon.slug}/')
+        self.assertEqual(response.data['tagline'], 'changed')
+
+        user = create_user('user')
+        Team.objects.create(name='team', hackathon=self.hackathon,
+                            leader=user, team_id='team')
+        # snapshot lookup, hackathon and its next status change
+        with self.assertNumQueries(3):
+            self.client.get(f'/hackathons/{self.hackathon.slug}/')
+
+    def test_conditional_requests(self):
+        response = self.client.get('/hackathons/')
+        etag = response['ETag']
+        response = self.client.get('/hackathons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            '/hackathons/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        create_hackathon('other')
+        response = self.client.get('/hackathons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_status_change_by_clock(self):
+        path = f'/hackathons/{self.hackathon.slug}/'
+        self.assertEqual(self.client.get(path).data['status'], 'Upcoming')
+        response = self.client.get('/hackathons/', {'query': 'upcoming'})
+        self.assertEqual(len(response.data['results']), 1)
+        started = self.hackathon.start + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=started):
+            self.assertEqual(self.client.get(path).data['status'], 'Ongoing')
+            response = self.client.get('/hackathons/', {'query': 'upcoming'})
+            self.assertEqual(len(response.data['results']), 0)
+
+    def test_authenticated_detail_is_not_cached(self):
+        user = create_user('user')
+        self.client.force_authenticate(user)
+        self.client.get(f'/hackathons/{self.hackathon.slug}/')
+        response = self.client.get(f'/hackathons/{self.hackathon.slug}/')
+        self.assertEqual(response.data['userStatus'], False)
+        self.assertNotIn('ETag', response)
+
+
+class HackathonUserStatusTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon')
+        self.team, self.other_team = create_teams(self.hackathon, 2)
+        Submission.objects.create(team=self.other_team, hackathon=self.hackathon,
+                                  submission_url='https://example.com/')
+
+    def get_user_status(self, user):
+        self.client.force_authenticate(user, token='token')
+        # hackathon with the status of the user
+        with self.assertNumQueries(1):
+            response = self.client.get('/hackathons/hackathon/')
+        return response.data['userStatus']
+
+    def test_user_status(self):
+        self.assertEqual(self.get_user_status(create_user('user')), 'not registered')
+        self.assertEqual(self.get_user_status(self.team.leader), 'registered')
+        self.assertEqual(self.get_user_status(self.other_team.leader), 'submitted')
+
+    def test_annotation(self):
+        other = create_hackathon('other')
+        hackathons = Hackathon.objects.with_user_status(
+            self.other_team.leader).order_by('slug')
+        self.assertEqual([(h.slug, h.annotated_user_status) for h in hackathons],
+                         [('hackathon', 'submitted'), ('other', 'not registered')])
+        data = HackathonDetailSerializer(other, context={
+            'request': mock.Mock(auth='token', user=self.team.leader)}).data
+        self.assertEqual(data['userStatus'], 'not registered')
+
+    def test_list_with_user_status(self):
+        create_hackathon('other', 2, 3)
+        self.client.force_authenticate(self.team.leader, token='token')
+        # hackathons of the page with the status of the user
+        with self.assertNumQueries(1):
+            response = self.client.get('/hackathons/', {'with_user_status': 1})
+        self.assertEqual({h['slug']: h['userStatus'] for h in response.data['results']},
+                         {'hackathon': 'registered', 'other': 'not registered'})
+        self.assertNotIn('ETag', response)
+
+        response = self.client.get('/hackathons/')
+        self.assertNotIn('userStatus', response.data['results'][0])
+        self.client.force_authenticate(None)
+        response = self.client.get('/hackathons/', {'with_user_status': 1})
+        self.assertEqual(response.data['results'][0]['userStatus'], False)
+        self.assertIn('ETag', response)
+
+
+class PaginationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hackathon = create_hackathon('hackathon', -2, -1)
+        teams = create_teams(self.hackathon, 7, members_per_team=1)
+        # Many equal scores, so that the pages have to seek past ties
+        for i, team in enumerate(teams):
+            Submission.objects.create(
+                team=team, hackathon=self.hackathon, score=i % 2,
+                submission_url='https://example.com/')
+
+    def walk(self, path, direction='next'):
+        pages = []
+        while path:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            for query in captured.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+            pages.append(response.data['results'])
+            path = response.data[direction]
+        return pages
+
+    def test_submission_pages(self):
+        pages = self.walk(
+            f'/hackathons/{self.hackathon.slug}/submissions/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        rows = [(row['score'], row['id']) for page in pages for row in page]
+        self.assertEqual(rows, sorted(rows, key=lambda row: (-row[0], row[1])))
+
+        last = self.client.get(
+            f'/hackathons/{self.hackathon.slug}/submissions/?page_size=3')
+        while last.data['next']:
+            last = self.client.get(last.data['next'])
+        backwards = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_team_pages(self):
+        pages = self.walk(
+            f'/hackathons/{self.hackathon.slug}/teams/?page_size=2')
+        ids = [team['id'] for page in pages for team in page]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 7)
+
+    def test_hackathon_pages(self):
+        create_hackathon('second', 1, 2)
+        create_hackathon('third', 3, 4)
+        pages = self.walk('/hackathons/?page_size=1')
+        self.assertEqual([page[0]['slug'] for page in pages],
+                         ['hackathon', 'second', 'third'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/hackathons/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor(self):
+        for position in (['x', 'y'], [None, None], [{}, 1]):
+            cursor = urlsafe_b64encode(json.dumps({'p': position, 'r': 0}).encode())
+            response = self.client.get(
+                f'/hackathons/{self.hackathon.slug}/submissions/', {'cursor': cursor.decode()})
+            self.assertEqual(response.status_code, 404, position)
+
+    def test_openapi_schema(self):
+        response = self.client.get('/swagger.json', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        parameters = response.json()['paths']['/hackathons/']['get']['parameters']
+        self.assertIn('cursor', [parameter['name'] for parameter in parameters])
+
+
+class ImportResultsTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon', -3, -1)
+        self.submissions = [
+            Submission.objects.create(team=team, hackathon=self.hackathon,
+                                      submission_url='https://example.com/')
+            for team in create_teams(self.hackathon, 4, 1)]
+        other = create_hackathon('other')
+        self.other_submission = Submission.objects.create(
+            team=create_teams(other, 1, 1)[0], hackathon=other,
+            submission_url='https://example.com/')
+
+    def write(self, content, extension='csv'):
+        fd, path = tempfile.mkstemp(suffix='.' + extension)
+        with os.fdopen(fd, 'w') as results_file:
+            results_file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_results(self, path, *args):
+        stderr = io.StringIO()
+        call_command('import_results', path, '--hackathon', self.hackathon.slug,
+                     *args, stdout=io.StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_csv(self):
+        first, second = self.submissions[:2]
+        path = self.write(f'id,Score,Review\n{first.id},90,Great\n{second.id},,\n')
+        # hackathon, a fetch and an update per batch of one, and the
+        # savepoint and release of the transaction
+        with self.assertNumQueries(1 + 2 * 2 + 2):
+            self.import_results(path, '--batch-size', '1', '--no-declare')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.score, first.review), (90, 'Great'))
+        self.assertEqual((second.score, second.review), (0, ''))
+
+    def test_jsonl_declares_results(self):
+        lines = [f'{{"id": {submission.id}, "score": {i}}}'
+                 for i, submission in enumerate(self.submissions)]
+        self.import_results(self.write('\n'.join(lines), 'jsonl'))
+        self.assertEqual(
+            list(Submission.objects.filter(hackathon=self.hackathon)
+                 .order_by('id').values_list('score', flat=True)),
+            [0, 1, 2, 3])
+        self.hackathon.refresh_from_db()
+        self.assertTrue(self.hackathon.results_declared)
+
+    def test_results_are_declared_with_the_import(self):
+        rows = [(2, {'id': self.submissions[0].id, 'score': 70})]
+        with self.captureOnCommitCallbacks() as callbacks:
+            # savepoint and release, a fetch and an update, and the hackathon
+            with self.assertNumQueries(2 + 2 + 1):
+                results.import_results(rows, self.hackathon, declare=True)
+        # Invalidated once, by the post_save signals of the hackathon
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(Hackathon.objects.get(pk=self.hackathon.pk).results_declared)
+
+    def test_invalid_rows(self):
+        valid = self.submissions[0]
+        path = self.write('\n'.join([
+            'id,score,review',
+            f'{valid.id},50,ok',
+            f'{self.submissions[1].id},101,too high',
+            f'{self.submissions[2].id},-1,too low',
+            'x,10,no id',
+            '999999,10,missing',
+            f'{self.other_submission.id},10,other hackathon',
+            f'{valid.id},60,repeated',
+        ]))
+        with self.assertRaises(CommandError):
+            self.import_results(path)
+        valid.refresh_from_db()
+        self.assertEqual(valid.score, 0)
+        self.hackathon.refresh_from_db()
+        self.assertFalse(self.hackathon.results_declared)
+
+        report = self.import_results(path, '--skip-invalid')
+        self.assertEqual([line.split(':')[0] for line in report.splitlines()],
+                         [f'Row {number}' for number in range(3, 9)])
+        self.assertIn('less than or equal to 100', report)
+        valid.refresh_from_db()
+        self.assertEqual(valid.score, 50)
+
+    def test_dry_run(self):
+        submission = self.submissions[0]
+        self.import_results(self.write(f'id,score\n{submission.id},80\n'), '--dry-run')
+        submission.refresh_from_db()
+        self.assertEqual(submission.score, 0)
+        self.hackathon.refresh_from_db()
+        self.assertFalse(self.hackathon.results_declared)
+
+    def test_without_hackathon(self):
+        unchanged = create_hackathon('unchanged', -3, -1)
+        for hackathon in (self.hackathon, self.other_submission.hackathon, unchanged):
+            HackathonSnapshot.objects.create(hackathon=hackathon, url=hackathon.slug,
+                                             key=hackathon.slug, content=b'', etag='')
+        rows = [(2, {'id': self.submissions[0].id, 'score': 70}),
+                (3, {'id': self.other_submission.id, 'score': 60})]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(results.import_results(rows), (2, []))
+        self.other_submission.refresh_from_db()
+        self.assertEqual(self.other_submission.score, 60)
+        self.assertEqual(list(HackathonSnapshot.objects.values_list('hackathon', flat=True)),
+                         [unchanged.pk])
+
+
+class LeaderboardTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon', -3, -1, results_declared=True)
+        self.teams = create_teams(self.hackathon, 5, 1)
+        now = timezone.now()
+        # (score, minutes after the first submission): the second submission
+        # ties the first on score but was made later, the third ties the
+        # second on both and shares its rank.
+        for team, (score, minutes) in zip(self.teams, [(90, 0), (90, 5), (90, 5), (80, 0)]):
+            submission = Submission.objects.create(
+                team=team, hackathon=self.hackathon, score=score,
+                submission_url='https://example.com/')
+            Submission.objects.filter(pk=submission.pk).update(
+                time=now + timedelta(minutes=minutes))
+        self.url = f'/hackathons/{self.hackathon.slug}/leaderboard/'
+
+    def test_ranking(self):
+        # snapshot lookup, ranked submissions and the insert of the
+        # snapshot rendered on this first request
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            [(entry['rank'], entry['teamName']) for entry in response.json()],
+            [(1, 'team-0'), (2, 'team-1'), (2, 'team-2'), (4, 'team-3')])
+
+        response = self.client.get(self.url + '?top=2')
+        self.assertEqual([entry['rank'] for entry in response.json()], [1, 2])
+        response = self.client.get(self.url + '?top=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rank_of_own_team(self):
+        ranks = {entry['teamName']: entry['rank']
+                 for entry in self.client.get(self.url).json()}
+        for team in self.teams[:4]:
+            self.client.force_authenticate(team.leader)
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url + 'me/')
+            self.assertEqual(response.data['rank'], ranks[team.name])
+
+        # The fifth team made no submission
+        self.client.force_authenticate(self.teams[4].leader)
+        response = self.client.get(self.url + 'me/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_not_declared(self):
+        self.hackathon.results_declared = False
+        self.hackathon.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get('/hackathons/unknown/leaderboard/').status_code, 404)
+        self.client.force_authenticate(self.teams[0].leader)
+        self.assertEqual(self.client.get(self.url + 'me/').status_code, 404)
+
+    def test_cached_until_results_change(self):
+        cache.clear()
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        submission = Submission.objects.get(team=self.teams[3])
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.score = 100
+            submission.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()[0]['teamName'], 'team-3')
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon', -5, -1)
+        self.teams = create_teams(self.hackathon, 3)
+        self.submission = Submission.objects.create(
+            team=self.teams[0], hackathon=self.hackathon,
+            submission_url='https://example.com/')
+
+    def get_teams(self, params):
+        return self.client.get('/hackathons/hackathon/teams/', params)
+
+    def test_unchanged_without_parameters(self):
+        response = self.get_teams({})
+        self.assertNotIn('included', response.data)
+        self.assertEqual(response.data['results'][0]['hackathon']['slug'], 'hackathon')
+
+    def test_collapsed_objects_are_included_once(self):
+        full = self.get_teams({})
+        with self.assertNumQueries(6):
+            response = self.get_teams({'expand': ''})
+        team = response.data['results'][0]
+        self.assertEqual(team['hackathon'], 'hackathon')
+        self.assertEqual(team['leader'], self.teams[0].leader.username)
+        self.assertEqual(team['members'], [user.username for user in self.teams[0].members.all()])
+        included = response.data['included']
+        self.assertEqual(list(included['hackathons']), ['hackathon'])
+        self.assertEqual(included['hackathons']['hackathon']['title'], 'hackathon')
+        self.assertEqual(len(included['users']), 9)
+        user = included['users'][team['leader']]
+        self.assertEqual(user['teams'], [self.teams[0].team_id])
+        self.assertEqual(included['teams'][self.teams[0].team_id]['hackathon'], 'hackathon')
+        self.assertLess(len(response.content), len(full.content) / 2)
+
+    def test_sparse_fields(self):
+        response = self.get_teams({'fields': 'name,members.username', 'expand': 'members'})
+        self.assertEqual(response.data['results'][0], {
+            'name': 'team-0',
+            'members': [{'username': user.username} for user in self.teams[0].members.all()],
+        })
+        self.assertEqual(response.data['included'], {})
+
+        response = self.client.get(f'/submissions/{self.submission.id}/',
+                                   {'fields': 'title,team.name,team.hackathon.title'})
+        self.assertEqual(response.data['title'], 'No title provided')
+        self.assertEqual(response.data['team'], {'name': 'team-0',
+                                                 'hackathon': {'title': 'hackathon'}})
+
+    def test_profile(self):
+        user = self.teams[0].leader
+        self.client.force_authenticate(user)
+        response = self.client.get('/profile/', {
+            'fields': 'username,teams', 'expand': 'teams'})
+        self.assertEqual(response.data['username'], user.username)
+        self.assertEqual(response.data['teams'][0]['hackathon'], 'hackathon')
+        self.assertEqual(list(response.data['included']), ['hackathons'])
+
+
+class SubmissionRUDViewTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon', -5, -1)
+        self.team, self.other_team = create_teams(self.hackathon, 2)
+        self.submission = Submission.objects.create(
+            team=self.team, hackathon=self.hackathon,
+            submission_url='https://example.com/')
+        self.path = f'/submissions/{self.submission.id}/'
+
+    def test_retrieve_query_count(self):
+        # submission with hackathon, team, leader and membership, then
+        # members, members' teams and leader's teams
+        with self.assertNumQueries(4):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['team']['members']), 3)
+        self.assertEqual(response.data['hackathon']['slug'], 'hackathon')
+        self.assertEqual(self.client.get('/submissions/0/').status_code, 404)
+
+    def test_update_needs_team_membership(self):
+        self.client.force_authenticate(self.other_team.leader)
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.path, {'title': 'Stolen'})
+        self.assertEqual(response.status_code, 403)
+        self.client.force_authenticate(self.team.members.last())
+        response = self.client.patch(self.path, {'title': 'Updated'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Updated')
+
+    def test_ongoing_and_upcoming(self):
+        Hackathon.objects.filter(pk=self.hackathon.pk).update(end=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.client.get(self.path).status_code, 403)
+        self.client.force_authenticate(self.other_team.leader)
+        self.assertEqual(self.client.get(self.path).status_code, 403)
+        self.client.force_authenticate(self.team.leader)
+        self.assertEqual(self.client.get(self.path).status_code, 200)
+        Hackathon.objects.filter(pk=self.hackathon.pk).update(start=timezone.now() + timedelta(days=1))
+        response = self.client.get(self.path)
+        self.assertEqual(response.data['detail'], 'Hackathon is not started yet')
+
+
+@override_settings(SNAPSHOT_BASE_URL='http://testserver')
+@mock.patch.object(TeamPagination, 'page_size', 2)
+@mock.patch.object(SubmissionPagination, 'page_size', 2)
+class SnapshotTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hackathon = create_hackathon('hackathon', -5, -1, results_declared=True)
+        self.teams = create_teams(self.hackathon, 5)
+        self.submissions = [
+            Submission.objects.create(team=team, hackathon=self.hackathon, score=i,
+                                      submission_url='https://example.com/')
+            for i, team in enumerate(self.teams)]
+        self.paths = ['/hackathons/hackathon/', '/hackathons/hackathon/teams/',
+                      '/hackathons/hackathon/submissions/',
+                      '/hackathons/hackathon/leaderboard/']
+
+    def freeze(self):
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('freeze_hackathon', 'hackathon', stdout=out)
+        return out.getvalue()
+
+    def test_frozen_responses_are_served(self):
+        self.client.force_authenticate(self.teams[0].leader, token='token')
+        # The responses of a member only differ in userStatus
+        expected = {path: self.client.get(path).json() for path in self.paths}
+        expected[self.paths[0]]['userStatus'] = False
+        self.client.force_authenticate(None)
+        # detail, 3 pages of teams, 3 pages of submissions and leaderboard
+        self.assertIn('Froze 8 responses of hackathon', self.freeze())
+        for path in self.paths:
+            with self.assertNumQueries(1):
+                response = self.client.get(path)
+            self.assertEqual(response.json(), expected[path])
+        next_page = self.client.get('/hackathons/hackathon/teams/').json()['next']
+        with self.assertNumQueries(1):
+            response = self.client.get(next_page)
+        self.assertEqual(len(response.json()['results']), 2)
+
+        response = self.client.get(self.paths[1], HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        identity = self.client.get(self.paths[1])
+        self.assertEqual(gzip.decompress(response.content), identity.content)
+        self.assertEqual(response['ETag'], 'W/' + identity['ETag'])
+        response = self.client.get(self.paths[1], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(SNAPSHOT_BASE_URL=None)
+    def test_off_without_base_url(self):
+        with self.assertRaisesMessage(CommandError, 'Set SNAPSHOT_BASE_URL'):
+            self.freeze()
+        response = self.client.get(self.paths[1])
+        self.assertTrue(response.json()['next'].startswith('http://testserver/'))
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+    def test_served_on_any_host(self):
+        self.freeze()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.paths[1], secure=True,
+                                       HTTP_HOST='api.example.com')
+        # Links are under SNAPSHOT_BASE_URL
+        self.assertTrue(response.json()['next'].startswith('http://testserver/'))
+
+    def test_rendered_on_first_request(self):
+        Hackathon.objects.filter(pk=self.hackathon.pk).update(results_declared=False)
+        self.hackathon.refresh_from_db()
+        with self.assertRaisesMessage(CommandError, 'results are not declared'):
+            self.freeze()
+        self.client.get(self.paths[1])
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+        self.hackathon.results_declared = True
+        self.hackathon.save()
+        expected = self.client.get(self.paths[1]).content
+        self.assertEqual(list(self.hackathon.snapshots.values_list('url', flat=True)),
+                         [self.paths[1]])
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.paths[1]).content, expected)
+
+    def test_only_canonical_urls_are_stored(self):
+        teams = self.paths[1]
+        for query in ('?junk=1', '?junk=2', '?page_size=2&page_size=3',
+                      '?page_size=100000', '?page_size=x', '?format=json'):
+            self.assertEqual(self.client.get(teams + query).status_code, 200)
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+        expected = self.client.get(teams + '?page_size=02&fields=name,id').json()
+        # The lookup of the same canonical path is cached
+        with self.assertNumQueries(0):
+            response = self.client.get(teams + '?fields=id,%20name&page_size=2')
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(list(self.hackathon.snapshots.values_list('url', flat=True)),
+                         [teams + '?fields=id%2Cname&page_size=2'])
+
+    @override_settings(SNAPSHOT_MAX_PER_HACKATHON=2)
+    def test_snapshots_per_hackathon_are_capped(self):
+        for path in self.paths:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertEqual(self.hackathon.snapshots.count(), 2)
+
+    def test_authenticated_requests_are_not_served(self):
+        self.freeze()
+        self.client.force_authenticate(self.teams[0].leader, token='token')
+        response = self.client.get(self.paths[0])
+        self.assertEqual(response.data['userStatus'], 'submitted')
+
+    def test_changes_delete_snapshots(self):
+        self.freeze()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submissions[-1].title = 'Changed'
+            self.submissions[-1].save()
+        self.assertFalse(self.hackathon.snapshots.exists())
+        response = self.client.get(self.paths[2])
+        self.assertEqual(response.json()['results'][0]['title'], 'Changed')
+
+    def test_frozen_profiles_follow_their_users(self):
+        member = self.teams[0].members.exclude(pk=self.teams[0].leader_id).first()
+        self.freeze()
+        with self.captureOnCommitCallbacks(execute=True):
+            member.bio = 'changed'
+            member.save()
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+        # Joining a team of another hackathon changes the member's teams
+        self.freeze()
+        other = create_hackathon('other', 1, 2)
+        team = Team.objects.create(name='other', hackathon=other, leader=create_user('leader'))
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMembership.objects.create(team=team, user=member, hackathon=other)
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+        self.freeze()
+        with self.captureOnCommitCallbacks(execute=True):
+            member.delete()
+        self.assertFalse(self.hackathon.snapshots.exists())
+
+    def test_writes_to_ineligible_hackathons_are_ignored(self):
+        ongoing = create_hackathon('ongoing')
+        team, = create_teams(ongoing, 1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Submission.objects.create(team=team, hackathon=ongoing,
+                                      submission_url='https://example.com/')
+            Team.objects.create(name='new', hackathon=ongoing, leader=create_user('new'))
+        self.assertEqual(callbacks, [])
+
+
+class HackathonSubmissionViewTests(APITestCase):
+
+    def setUp(self):
+        self.ongoing = create_hackathon('ongoing')
+        self.completed = create_hackathon('completed', -3, -1)
+        for hackathon in (self.ongoing, self.completed):
+            for team in create_teams(hackathon, 5, 1):
+                Submission.objects.create(team=team, hackathon=hackathon,
+                                          submission_url='https://example.com/')
+        self.member = Team.objects.filter(hackathon=self.ongoing).first().leader
+
+    def get_submissions(self, hackathon):
+        return self.client.get(f'/hackathons/{hackathon.slug}/submissions/')
+
+    def test_superuser(self):
+        self.client.force_authenticate(User.objects.create(
+            uid='admin', username='admin', is_superuser=True))
+        # hackathon and submissions joined to teams
+        with self.assertNumQueries(2):
+            response = self.get_submissions(self.ongoing)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['teamName'], 'team-0')
+
+    def test_team_member(self):
+        self.client.force_authenticate(self.member)
+        # hackathon, the member's team and its submission
+        with self.assertNumQueries(3):
+            response = self.get_submissions(self.ongoing)
+        self.assertEqual([submission['teamName'] for submission in response.data['results']],
+                         ['team-0'])
+
+    def test_public_after_hackathon_ends(self):
+        # snapshot lookup, hackathon and submissions joined to teams
+        with self.assertNumQueries(3):
+            response = self.get_submissions(self.completed)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual({submission['teamName'] for submission in response.data['results']},
+                         {f'team-{i}' for i in range(5)})
+
+    def test_anonymous_during_hackathon(self):
+        with self.assertNumQueries(2):
+            response = self.get_submissions(self.ongoing)
+        self.assertEqual(response.status_code, 401)
+
+
+class TeamAdminTests(SimpleTestCase):
+
+    def test_hackathon_of_existing_teams_is_read_only(self):
+        team_admin = TeamsPageAdmin(Team, admin.site)
+        request = RequestFactory().get('/admin/')
+        self.assertEqual(team_admin.get_readonly_fields(request), ())
+        self.assertEqual(team_admin.get_readonly_fields(request, Team(pk=1)), ('hackathon',))
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.execute_wrappers = []
+
+    def connect(self):
+        time.sleep(0.01)
+
+
+@override_settings(INSTRUMENTATION={'SAMPLE_RATE': 1, 'SERVER_TIMING': True,
+                                    'VIEW_MODULES': ('core.views',)})
+class InstrumentationTests(APITestCase):
+
+    def get_record(self, logs):
+        return json.loads(logs.records[0].getMessage())
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            instrumentation.fingerprint(
+                "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'it''s' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+
+    def test_request_metrics(self):
+        hackathon = create_hackathon('hackathon')
+        create_teams(hackathon, 2)
+        with self.assertLogs('hackalog.instrumentation') as logs:
+            response = self.client.get('/hackathons/hackathon/teams/')
+        record = self.get_record(logs)
+        self.assertEqual(record['view'], 'core.views.HackathonTeamView')
+        self.assertEqual(record['queries'], 6)
+        self.assertEqual(record['response_bytes'], len(response.content))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('6 queries', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_serialization_is_timed_apart(self):
+        hackathon = create_hackathon('hackathon')
+        create_teams(hackathon, 2)
+        response = self.client.get('/hackathons/hackathon/teams/')
+        timing = response['Server-Timing']
+        self.assertLess(timing.index('serialize;dur='), timing.index('render;dur='))
+
+        teams = list(Team.objects.select_related('hackathon'))
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.current_metrics.set(metrics)
+        try:
+            with mock.patch.object(instrumentation.time, 'perf_counter',
+                                   side_effect=range(100)):
+                TeamSerializer(teams, many=True).data
+        finally:
+            instrumentation.current_metrics.reset(token)
+        # One clock step per team, without the nested hackathons
+        self.assertEqual(metrics.serialize_time, 2)
+        self.assertFalse(metrics.serializing)
+
+    def test_asgi_requests_are_instrumented(self):
+        # The view runs in another thread than the middleware, with a
+        # connection of its own
+        with self.assertLogs('hackalog.instrumentation') as logs:
+            status = asyncio.run(asgi_get(ASGIHandler(), '/hackathons/'))
+        self.assertEqual(status, 200)
+        self.assertGreater(self.get_record(logs)['queries'], 0)
+
+    def test_duplicate_queries(self):
+        def get_response(request):
+            request.resolver_match = resolve('/hackathons/')
+            for slug in ('first', 'second', 'third'):
+                Hackathon.objects.filter(slug=slug).first()
+            return HttpResponse()
+
+        middleware = instrumentation.InstrumentationMiddleware(get_response)
+        with self.assertLogs('hackalog.instrumentation') as logs:
+            response = middleware(RequestFactory().get('/hackathons/'))
+        duplicates = self.get_record(logs)['duplicate_queries']
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]['count'], 3)
+        self.assertIn('"core_hackathon"."slug" = ?', duplicates[0]['sql'])
+        self.assertIn('2 repeated queries', response['Server-Timing'])
+
+    def test_connection_setup_is_timed(self):
+        connection = FakeConnection()
+
+        def get_response(request):
+            request.resolver_match = resolve('/hackathons/')
+            connection.connect()
+            return HttpResponse()
+
+        middleware = instrumentation.InstrumentationMiddleware(get_response)
+        with mock.patch.object(instrumentation, 'connections', {'default': connection}):
+            with self.assertLogs('hackalog.instrumentation'):
+                response = middleware(RequestFactory().get('/hackathons/'))
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('db-connect;dur='))
+        self.assertGreaterEqual(float(timing.split('dur=')[1].split(';')[0]), 10)
+        self.assertIn('1 new', timing)
+
+    def test_sampling_and_other_views(self):
+        with override_settings(INSTRUMENTATION={'SAMPLE_RATE': 0, 'SERVER_TIMING': True,
+                                                'VIEW_MODULES': ('core.views',)}):
+            with self.assertNoLogs('hackalog.instrumentation'):
+                response = self.client.get('/hackathons/')
+            self.assertNotIn('Server-Timing', response)
+        with self.assertNoLogs('hackalog.instrumentation'):
+            response = self.client.get('/colleges/?q=a')
+        self.assertNotIn('Server-Timing', response)
+        self.assertIsNone(instrumentation.current_metrics.get())
+
+
+class RendererTests(SimpleTestCase):
+
+    def test_same_json_as_drf(self):
+        data = {
+            'when': timezone.now(), 'day': timezone.now().date(),
+            'score': Decimal('12.50'), 'id': uuid.uuid4(), 'label': gettext_lazy('Team'),
+            'text': 'caf\u00e9 \u2028 \u2029 "quoted"', 1: [None, True, 1.5],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(ORJSONRenderer().render([1], 'application/json; indent=4'),
+                         b'[\n  1\n]')
+
+    def test_parser(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "café"}'.encode())),
+                         {'name': 'café'})
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "café"}'.encode('utf-16')),
+                                      parser_context={'encoding': 'utf-16'}),
+                         {'name': 'café'})
+        with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+            parser.parse(io.BytesIO(b'{"name": NaN}'))
+
+
+class CompressionTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_teams(create_hackathon('hackathon'), 5)
+        self.path = '/hackathons/hackathon/teams/'
+        self.content = self.client.get(self.path).content
+
+    def test_negotiate(self):
+        with override_settings(COMPRESSION={**settings.COMPRESSION, 'ENCODINGS': ('br', 'gzip')}):
+            with mock.patch.object(compression, 'brotli', object()):
+                self.assertEqual(compression.negotiate('gzip, deflate, br'), 'br')
+                self.assertEqual(compression.negotiate('gzip, br;q=0.5'), 'gzip')
+                self.assertEqual(compression.negotiate('*'), 'br')
+            with mock.patch.object(compression, 'brotli', None):
+                self.assertEqual(compression.negotiate('gzip, deflate, br'), 'gzip')
+        self.assertIsNone(compression.negotiate('gzip;q=0, deflate'))
+        self.assertIsNone(compression.negotiate(''))
+
+    def test_large_responses_are_compressed(self):
+        response = self.client.get(self.path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(self.content) / 4)
+        self.assertEqual(gzip.decompress(response.content), self.content)
+
+    def test_compression_is_skipped(self):
+        response = self.client.get(self.path)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(self.path, HTTP_ACCEPT_ENCODING='deflate')
+        self.assertNotIn('Content-Encoding', response)
+        with override_settings(COMPRESSION={**settings.COMPRESSION,
+                                            'MIN_SIZE': len(self.content) + 1}):
+            response = self.client.get(self.path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    @override_settings(INSTRUMENTATION={'SAMPLE_RATE': 1, 'SERVER_TIMING': True,
+                                        'VIEW_MODULES': ('core.views',)})
+    def test_compression_is_timed(self):
+        with self.assertLogs('hackalog.instrumentation') as logs:
+            response = self.client.get(self.path, HTTP_ACCEPT_ENCODING='gzip')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['compress_ms'], 0)
+        self.assertEqual(record['response_bytes'], len(response.content))
+        self.assertIn('compress;dur=', response['Server-Timing'])
+
+
+class ThrottlingTests(SimpleTestCase):
+
+    def setUp(self):
+        throttling.local_counters.clear()
+
+    def test_local_counters(self):
+        counters = throttling.LocalCounters(max_size=2)
+        self.assertEqual(counters.incr('a', 60), 1)
+        self.assertEqual(counters.incr('a', 60), 2)
+        self.assertEqual(counters.incr('b', 0), 1)
+        self.assertEqual(counters.incr('b', 60), 1)
+        counters.incr('c', 60)
+        self.assertEqual(list(counters.counts), ['b', 'c'])
+
+    @override_settings(THROTTLING={'SHARED_CACHE': 'default', 'LOCAL_MAX_SIZE': 10})
+    def test_shared_cache_falls_back_to_local_counters(self):
+        cache.clear()
+        self.assertEqual(throttling.incr('key', 60), 1)
+        self.assertEqual(throttling.incr('key', 60), 2)
+        self.assertEqual(cache.get('throttle:key'), 2)
+        with mock.patch.object(cache, 'add', side_effect=ConnectionError):
+            with self.assertLogs('hackalog.throttling', 'WARNING'):
+                self.assertEqual(throttling.incr('key', 60), 1)
+        self.assertEqual(throttling.local_counters.counts['key'][0], 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def run_concurrently(self, flight, function, count=5):
+        results, errors = [], []
+        started = threading.Barrier(count)
+
+        def call():
+            started.wait()
+            try:
+                results.append(flight.do('key', function))
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_call(self):
+        flight = coalescing.SingleFlight()
+        calls = []
+
+        def function():
+            calls.append(None)
+            time.sleep(0.1)
+            return object()
+
+        results, _ = self.run_concurrently(flight, function)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+        self.assertEqual(flight.calls, {})
+        # Results are not kept
+        flight.do('key', function)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_shared(self):
+        def function():
+            time.sleep(0.1)
+            raise ValueError('invalid')
+
+        results, errors = self.run_concurrently(coalescing.SingleFlight(), function)
+        self.assertEqual((len(results), len(errors)), (0, 5))
+
+
+class JoinTeamTests(APITestCase):
+
+    def setUp(self):
+        self.hackathon = create_hackathon('hackathon', 5, 10, max_team_size=4)
+        self.team, self.other_team = create_teams(self.hackathon, 2, 2)
+        self.user = create_profile('joiner')
+        self.client.force_authenticate(self.user)
+
+    def join(self, team):
+        return self.client.patch(
+            f'/hackathons/hackathon/teams/join/{team.team_id}/')
+
+    def test_join(self):
+        # team and hackathon, conditional update and insert, in a savepoint
+        with self.assertNumQueries(5):
+            response = self.join(self.team)
+        self.assertEqual(response.status_code, 200)
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 3)
+        self.assertIn(self.user, self.team.members.all())
+
+        response = self.join(self.team)
+        self.assertEqual(response.data[0], 'You are already in the team!')
+        response = self.join(self.other_team)
+        self.assertEqual(response.data[0],
+                         'You are already part of some team in this hackathon.')
+
+    def test_full_team(self):
+        self.join(self.team)
+        self.client.force_authenticate(create_profile('last'))
+        self.join(self.team)
+        self.client.force_authenticate(create_profile('late'))
+        response = self.join(self.team)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], 'Team is full!')
+        self.assertEqual(self.team.members.count(), 4)
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 4)
+
+    def test_create_team(self):
+        response = self.client.post('/hackathons/hackathon/teams/', {'name': 'new'})
+        self.assertEqual(response.status_code, 201)
+        team = Team.objects.get(team_id=response.data['team_id'])
+        self.assertEqual(team.member_count, 1)
+        self.assertEqual(list(team.members.all()), [self.user])
+
+        response = self.client.post('/hackathons/hackathon/teams/', {'name': 'newer'})
+        self.assertEqual(response.data[0],
+                         'You are already part of a team in this hackathon.')
+        self.client.force_authenticate(create_profile('other'))
+        response = self.client.post('/hackathons/hackathon/teams/', {'name': 'new'})
+        self.assertEqual(response.data[0],
+                         'Team with this name already exists in the Hackathon!')
+        self.assertEqual(self.hackathon.participating_teams.count(), 3)
+
+    def test_one_team_per_hackathon_is_a_constraint(self):
+        with self.assertRaises(IntegrityError):
+            TeamMembership.objects.create(
+                team=self.other_team, hackathon=self.hackathon,
+                user=self.team.leader)
+
+    def test_not_found(self):
+        response = self.client.patch('/hackathons/missing/teams/join/team/')
+        self.assertEqual(response.data['detail'], 'Hackathon does not exist!')
+        response = self.client.patch('/hackathons/hackathon/teams/join/team/')
+        self.assertEqual(response.data['detail'], 'Team does not exist!')
+
+    def test_member_count_follows_member_changes(self):
+        user = self.team.members.exclude(pk=self.team.leader_id).get()
+        self.client.force_authenticate(user)
+        self.client.patch(f'/teams/{self.team.team_id}/member-exit/{user.username}')
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 1)
+        user.teams_as_a_member.add(
+            self.other_team, through_defaults={'hackathon': self.hackathon})
+        self.other_team.refresh_from_db()
+        self.assertEqual(self.other_team.member_count, 3)
+        user.teams_as_a_member.clear()
+        self.other_team.refresh_from_db()
+        self.assertEqual(self.other_team.member_count, 2)
+
+    def test_member_count_follows_deleted_users(self):
+        user = self.team.members.exclude(pk=self.team.leader_id).get()
+        user.delete()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 1)
+
+    @mock.patch.object(throttling.WindowRateThrottle, 'timer', return_value=90.0)
+    def test_join_is_throttled(self, timer):
+        rates = {'join_user': '1/min', 'join_ip': '3/min'}
+        cache.clear()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 0,
+                                               'DEFAULT_THROTTLE_RATES': rates}):
+            self.join(self.team)
+            response = self.join(self.other_team)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+            self.client.force_authenticate(create_profile('other'))
+            self.assertEqual(self.join(self.other_team).status_code, 200)
+            # Throttled requests count too
+            self.client.force_authenticate(create_profile('third'))
+            self.assertEqual(self.join(self.other_team).status_code, 429)
+            timer.return_value = 120.0
+            self.assertEqual(self.join(self.other_team).status_code, 200)
+
+    def test_join_racing_another_join(self):
+        self.join(self.team)
+        self.team.members.remove(self.user)
+        self.client.force_authenticate(create_profile('racer'))
+        raced = []
+
+        def concurrent_join(execute, sql, params, many, context):
+            # Fills the team between the join's read and its update
+            if sql.startswith('UPDATE') and not raced:
+                raced.append(sql)
+                Team.objects.filter(pk=self.team.pk).update(member_count=4)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(concurrent_join):
+            response = self.join(self.team)
+        self.assertEqual(response.data[0], 'Team is full!')
+        self.assertNotIn('racer', self.team.members.values_list('pk', flat=True))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentJoinTests(APITransactionTestCase):
+    """
+    Needs a database with row locks, see TEST_DATABASE in settings.
+    """
+
+    def test_concurrent_joins_never_overfill(self):
+        hackathon = create_hackathon('hackathon', 5, 10, max_team_size=5)
+        team, = create_teams(hackathon, 1, 1)
+        users = [create_profile(f'joiner-{i}') for i in range(20)]
+        barrier = threading.Barrier(len(users))
+        statuses = []
+
+        def join(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.patch(
+                    f'/hackathons/hackathon/teams/join/{team.team_id}/')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=join, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        team.refresh_from_db()
+        self.assertEqual(statuses.count(200), 4)
+        self.assertEqual(statuses.count(400), 16)
+        self.assertEqual(team.member_count, 5)
+        self.assertEqual(team.members.count(), 5)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import HackathonsRUDView, HackathonListCreateView, HackathonTeamView, JoinTeamView, HackathonSubmissionView, TeamView, MemberExitView, SubmissionRUDView
+from .views import HackathonsRUDView, HackathonListCreateView, HackathonTeamView, JoinTeamView, HackathonSubmissionView, TeamView, MemberExitView, SubmissionRUDView, LeaderboardView, LeaderboardRankView
 
 urlpatterns = [
     path('hackathons/<slug:slug>/teams/', HackathonTeamView.as_view()),
@@ -10,6 +10,8 @@ urlpatterns = [
     path('hackathons/<slug:slug>/teams/join/<str:team_id>/', JoinTeamView.as_view()),
     path('hackathons/<slug:slug>/submissions/',
          HackathonSubmissionView.as_view()),
+    path('hackathons/<slug:slug>/leaderboard/', LeaderboardView.as_view()),
+    path('hackathons/<slug:slug>/leaderboard/me/', LeaderboardRankView.as_view()),
     path('teams/<str:team_id>/', TeamView.as_view(),
          name='Team Read, Edit, Delete View'),
     path('teams/<str:team_id>/member-exit/<str:username>',
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import reset_queries
+from django.db.models import prefetch_related_objects
 from rest_framework import generics, status, permissions, exceptions
 from rest_framework.response import Response
 from django.utils import timezone
@@ -6,7 +8,7 @@ from django.utils.decorators import method_decorator
 from django.shortcuts import get_list_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Hackathon, Team, Submission
+from .models import Hackathon, Team, Submission, team_detail_prefetches
 from .serializers import (
     HackathonSerializer,
     TeamDetailSerializer,
@@ -15,13 +17,18 @@ from .serializers import (
     SubmissionsSerializer,
     MemberExitSerializer,
     SubmissionRUDSerializer,
-    HackathonDetailSerializer
+    HackathonDetailSerializer,
+    LeaderboardSerializer
 )
 from .permissions import (
     HackathonPermissions,
     AllowCompleteProfile,
     IsLeaderOrSuperUser
 )
+from .cache import CachedResponseMixin
+from .fieldsets import SparseFieldsetMixin
+from .snapshots import FIELDSET_PARAMS, PAGE_PARAMS, SnapshotMixin, bounded_number
+from .pagination import HackathonPagination, TeamPagination, SubmissionPagination
 
 query_param = openapi.Parameter(
     'user_specific', openapi.IN_QUERY,
@@ -31,13 +38,15 @@ query_param = openapi.Parameter(
 
 
 @method_decorator(name="get", decorator=swagger_auto_schema(manual_parameters=[query_param]))
-class HackathonTeamView(generics.ListCreateAPIView):
+class HackathonTeamView(SnapshotMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     get:
     Returns a list of teams in a particular hackathon
     post:
     Creates a new team in a hackathon and return the team_id
     """
+    pagination_class = TeamPagination
+    snapshot_params = {**PAGE_PARAMS, **FIELDSET_PARAMS}
 
     def get_permissions(self):
         user_specific = self.request.query_params.get('user_specific', None)
@@ -56,10 +65,9 @@ class HackathonTeamView(generics.ListCreateAPIView):
             return TeamCreateSerializer
 
     def get_serializer_context(self):
-        return {
-            'request': self.request,
-            'kwargs': self.kwargs
-        }
+        context = super().get_serializer_context()
+        context['kwargs'] = self.kwargs
+        return context
 
     def get_queryset(self, **kwargs):
         user_specific = self.request.query_params.get('user_specific', None)
@@ -69,12 +77,9 @@ class HackathonTeamView(generics.ListCreateAPIView):
             hackathon = Hackathon.objects.get(slug=self.kwargs['slug'])
         except Hackathon.DoesNotExist:
             raise exceptions.NotFound("Hackathon does not exist!")
+        queryset = Team.objects.filter(hackathon=hackathon).with_details()
         if user_specific in ['y', 'Y', 'True']:
-            queryset = Team.objects.filter(hackathon=hackathon, members=self.request.user).select_related(
-                'leader').prefetch_related('members')
-        else:
-            queryset = Team.objects.filter(hackathon=hackathon).select_related(
-                'leader').prefetch_related('members')
+            queryset = queryset.filter(members=self.request.user)
         return queryset
 
     def post(self, request, **kwargs):
@@ -92,6 +97,7 @@ class JoinTeamView(generics.GenericAPIView):
     """
     serializer_class = JoinTeamSerializer
     permission_classes = [permissions.IsAuthenticated, AllowCompleteProfile]
+    throttle_scope = 'join'
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -115,16 +121,25 @@ query_param = openapi.Parameter(
     type=openapi.TYPE_STRING, enum=['completed', 'upcoming', 'ongoing'])
 
 
-@method_decorator(name="get", decorator=swagger_auto_schema(manual_parameters=[query_param]))
-class HackathonListCreateView(generics.ListCreateAPIView):
+user_status_param = openapi.Parameter(
+    'with_user_status', openapi.IN_QUERY, description="Include the userStatus of "
+    "every hackathon for the authenticated user.", type=openapi.TYPE_BOOLEAN)
+
+
+@method_decorator(name="get", decorator=swagger_auto_schema(
+    manual_parameters=[query_param, user_status_param]))
+class HackathonListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     """
     get:
     Returns list of Hackathons according to query parameter.
+    With with_user_status=1, each hackathon also has the userStatus of the
+    authenticated user, as in the hackathon detail.
 
     post:
     Creates a new hackathon. Only admin can create a hackathon
     """
     serializer_class = HackathonSerializer
+    pagination_class = HackathonPagination
 
     def get_permissions(self):
         if self.request.method == "GET":
@@ -132,26 +147,37 @@ class HackathonListCreateView(generics.ListCreateAPIView):
         else:
             return [permissions.IsAdminUser()]
 
+    def with_user_status(self):
+        return (self.request.method == 'GET' and self.request.query_params.get(
+            'with_user_status', '').lower() in ('1', 'true'))
+
+    def is_cacheable(self, request):
+        # userStatus differs for every authenticated user
+        return not (self.with_user_status() and request.user.is_authenticated)
+
+    def get_serializer_class(self):
+        if self.with_user_status():
+            return HackathonDetailSerializer
+        return HackathonSerializer
+
+    def get_status_queryset(self):
+        return Hackathon.objects.all()
+
     def get_queryset(self):
-        queryset = Hackathon.objects.all()
-        query = self.request.query_params.get('query', None)
         current_date = timezone.now()
+        queryset = Hackathon.objects.with_status(current_date)
+        query = self.request.query_params.get('query', None)
         if query is not None:
-            if (query == 'ongoing'):
-                queryset = Hackathon.objects.filter(
-                    start__lt=current_date, end__gt=current_date)
-            elif (query == 'completed'):
-                queryset = Hackathon.objects.filter(
-                    start__lt=current_date, end__lt=current_date)
-            elif (query == 'upcoming'):
-                queryset = Hackathon.objects.filter(
-                    start__gt=current_date, end__gt=current_date)
-            else:
+            if query not in ['completed', 'upcoming', 'ongoing']:
                 raise exceptions.ValidationError("Invalid query parameter!")
+            queryset = queryset.filter_status(query.capitalize(), current_date)
+        if self.with_user_status() and self.request.auth:
+            # userStatus of every hackathon of the page in the same query
+            queryset = queryset.with_user_status(self.request.user)
         return queryset
 
 
-class HackathonsRUDView(generics.RetrieveUpdateDestroyAPIView):
+class HackathonsRUDView(SnapshotMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API used to read, update or delete the hackathon objects by their id.
     Only the Super User has the permissions to update or delete hackathon objects.
@@ -160,10 +186,23 @@ class HackathonsRUDView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [HackathonPermissions]
     serializer_class = HackathonDetailSerializer
     lookup_field = 'slug'
-    queryset = Hackathon.objects.all()
+
+    def is_cacheable(self, request):
+        # userStatus differs for every authenticated user
+        return not request.user.is_authenticated
+
+    def get_queryset(self):
+        queryset = Hackathon.objects.with_status()
+        if self.request.auth:
+            # userStatus in the same query as the hackathon
+            queryset = queryset.with_user_status(self.request.user)
+        return queryset
+
+    def get_status_queryset(self):
+        return Hackathon.objects.filter(slug=self.kwargs['slug'])
 
 
-class HackathonSubmissionView(generics.ListCreateAPIView):
+class HackathonSubmissionView(SnapshotMixin, generics.ListCreateAPIView):
     """
     API to handle GET and POST for submission.
     For GET method:
@@ -180,6 +219,8 @@ class HackathonSubmissionView(generics.ListCreateAPIView):
     """
     serializer_class = SubmissionsSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = SubmissionPagination
+    snapshot_params = PAGE_PARAMS
 
     def get_queryset(self, **kwargs):
         if getattr(self, 'swagger_fake_view', False):
@@ -190,10 +231,12 @@ class HackathonSubmissionView(generics.ListCreateAPIView):
             raise exceptions.NotFound("Hackathon does not exists!")
         else:
             user = self.request.user
+            submissions = Submission.objects.filter(
+                hackathon=hackathon).select_related('team')
             if hackathon.status == "Ongoing":
                 if user.is_authenticated:
                     if user.is_superuser:
-                        return Submission.objects.filter(hackathon=hackathon)
+                        return submissions
                     else:
                         try:
                             team = Team.objects.get(
@@ -201,12 +244,12 @@ class HackathonSubmissionView(generics.ListCreateAPIView):
                         except Team.DoesNotExist:
                             raise exceptions.NotFound("Team does not exists!")
                         else:
-                            return Submission.objects.filter(hackathon=hackathon, team=team)
+                            return submissions.filter(team=team)
                 else:
                     raise exceptions.NotAuthenticated(
                         detail="Authentication is required to get submissions of ongoing hackathon!")
             else:
-                return Submission.objects.filter(hackathon=hackathon)
+                return submissions
 
     def create(self, request, *args, **kwargs):
         try:
@@ -244,7 +287,91 @@ class HackathonSubmissionView(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class TeamView(generics.RetrieveUpdateDestroyAPIView):
+def get_results_hackathon(slug):
+    """
+    The hackathon of a leaderboard. Only looked up to explain an empty
+    leaderboard, which the leaderboard queries do not tell apart from an
+    unknown hackathon or undeclared results.
+    """
+    try:
+        hackathon = Hackathon.objects.get(slug=slug)
+    except Hackathon.DoesNotExist:
+        raise exceptions.NotFound("Hackathon does not exist!")
+    if not hackathon.results_declared:
+        raise exceptions.NotFound("Results of this hackathon have not been declared yet!")
+    return hackathon
+
+
+query_param = openapi.Parameter(
+    'top', openapi.IN_QUERY,
+    description=f"Query parameter - Number of submissions to return, {settings.REST_FRAMEWORK['PAGE_SIZE']} if not specified and at most {settings.API_MAX_PAGE_SIZE}.",
+    type=openapi.TYPE_INTEGER)
+
+
+@method_decorator(name="get", decorator=swagger_auto_schema(manual_parameters=[query_param]))
+class LeaderboardView(SnapshotMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    get:
+    Returns the top submissions of a hackathon with declared results,
+    ranked by score and then by submission time.
+    """
+    serializer_class = LeaderboardSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    snapshot_params = {'top': bounded_number}
+
+    def get_status_queryset(self):
+        # The ranking does not depend on the status of the hackathon
+        return Hackathon.objects.none()
+
+    def get_top(self):
+        top = self.request.query_params.get('top', settings.REST_FRAMEWORK['PAGE_SIZE'])
+        try:
+            top = int(top)
+        except ValueError:
+            raise exceptions.ValidationError({'top': 'A number is required.'})
+        if top < 1:
+            raise exceptions.ValidationError({'top': 'Must be at least 1.'})
+        return min(top, settings.API_MAX_PAGE_SIZE)
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return Submission.objects.filter(
+            hackathon__slug=self.kwargs['slug'],
+            hackathon__results_declared=True,
+        ).ranked()[:self.get_top()]
+
+    def list(self, request, *args, **kwargs):
+        submissions = list(self.get_queryset())
+        if not submissions:
+            get_results_hackathon(self.kwargs['slug'])
+        serializer = self.get_serializer(submissions, many=True)
+        return Response(serializer.data)
+
+
+class LeaderboardRankView(generics.RetrieveAPIView):
+    """
+    get:
+    Returns the rank of the submission of the current user's team in a
+    hackathon with declared results.
+    """
+    serializer_class = LeaderboardSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        submission = Submission.objects.filter(
+            hackathon__slug=self.kwargs['slug'],
+            hackathon__results_declared=True,
+            team__members=self.request.user,
+        ).with_rank().first()
+        if submission is None:
+            get_results_hackathon(self.kwargs['slug'])
+            raise exceptions.NotFound("Your team has no submission in this hackathon!")
+        return submission
+
+
+class TeamView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API used to read, update or delete the Team objects by their team_id. Only the Super User has the permissions to delete Team objects.
     """
@@ -256,8 +383,7 @@ class TeamView(generics.RetrieveUpdateDestroyAPIView):
             return [permissions.IsAuthenticated(), IsLeaderOrSuperUser()]
 
     serializer_class = TeamDetailSerializer
-    queryset = Team.objects.all().select_related(
-        'leader').prefetch_related('members')
+    queryset = Team.objects.with_details()
     lookup_field = 'team_id'
 
 
@@ -285,7 +411,7 @@ class MemberExitView(generics.GenericAPIView):
         return Response("Successfully removed from the team", status=status.HTTP_200_OK)
 
 
-class SubmissionRUDView(generics.RetrieveUpdateDestroyAPIView):
+class SubmissionRUDView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API used to read, update and delete the particular submissions of particular hackathon.
     """
@@ -301,35 +427,31 @@ class SubmissionRUDView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self, **kwargs):
         if getattr(self, 'swagger_fake_view', False):
             return None
-
-        queryset = Submission.objects.filter(
-            id=self.kwargs['id']).select_related('team', 'hackathon')
-        user = self.request.user
-        if queryset:
-            hackathon = Hackathon.objects.get(id=queryset[0].hackathon_id)
-            if hackathon.status == 'Completed':
-                if self.request.method == 'GET':
-                    return queryset
-                elif self.request.method == 'DELETE' or self.request.method == 'PUT' or self.request.method == 'PATCH':
-                    try:
-                        team = Team.objects.get(
-                            members=user, hackathon=hackathon)
-                        return queryset
-                    except Team.DoesNotExist:
-                        raise exceptions.PermissionDenied(
-                            detail="Not the member of registered Team")
-            elif hackathon.status == 'Ongoing':
-                if not user:
-                    raise exceptions.PermissionDenied(
-                        detail="Must be Logged in to view ongoing submissions")
-                try:
-                    team = Team.objects.get(members=user, hackathon=hackathon)
-                    return queryset
-                except Team.DoesNotExist:
-                    raise exceptions.PermissionDenied(
-                        detail="Not the member of registered Team")
-            else:
-                raise exceptions.PermissionDenied(
-                    detail="Hackathon is not started yet")
-        else:
+        return Submission.objects.select_related(
+            'hackathon', 'team__hackathon', 'team__leader',
+        ).with_is_member(self.request.user)
+
+    def get_object(self):
+        """
+        The submission with its hackathon, team and whether the user is in
+        the team, in one query. Team members and their teams are only
+        prefetched once access is granted.
+        """
+        try:
+            submission = self.get_queryset().get(id=self.kwargs['id'])
+        except Submission.DoesNotExist:
             raise exceptions.NotFound("Submission does not exist!")
+        hackathon_status = submission.hackathon.status
+        if hackathon_status == 'Upcoming':
+            raise exceptions.PermissionDenied(
+                detail="Hackathon is not started yet")
+        if hackathon_status == 'Ongoing' or self.request.method != 'GET':
+            if not self.request.user.is_authenticated:
+                raise exceptions.PermissionDenied(
+                    detail="Must be Logged in to view ongoing submissions")
+            if not submission.is_member:
+                raise exceptions.PermissionDenied(
+                    detail="Not the member of registered Team")
+        self.check_object_permissions(self.request, submission)
+        prefetch_related_objects([submission.team], *team_detail_prefetches())
+        return submission
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration, read by `gunicorn` from the working directory.
+
+SERVER_MODE selects the application: 'wsgi' (default) runs hackalog.wsgi in
+sync workers, 'asgi' runs hackalog.asgi in uvicorn workers, where Django
+runs the views of every request in a thread of its own. Only the server
+changes: the views are the same sync views in both modes.
+"""
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+# gunicorn's default of one worker. Each worker thread holds a database
+# connection of its own for DB_CONN_MAX_AGE seconds.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'hackalog.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'hackalog.wsgi:application'
+    threads = int(os.environ.get('GUNICORN_THREADS', 1))
+else:
+    raise ValueError(f'Unknown SERVER_MODE {SERVER_MODE!r}, expected wsgi or asgi')
@@ -0,0 +1,47 @@
+"""
+Coalescing of concurrent identical calls.
+
+SingleFlight.do(key, function) runs `function` once for all the threads of
+a process calling it with the same `key` at the same time: the first one
+runs it, the others wait and get its result, or its exception. Results are
+not kept once the call is over.
+"""
+import threading
+
+
+class Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
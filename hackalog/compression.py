@@ -0,0 +1,98 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses responses of at least
+settings.COMPRESSION['MIN_SIZE'] bytes with the encoding the client prefers
+among COMPRESSION['ENCODINGS'], in the order of the server's preference
+when the client has none. Brotli ('br') requires the brotli package and is
+skipped without it.
+
+Responses which already have a Content-Encoding, such as the gzipped
+snapshots of core.snapshots, are left as they are. Compression time is
+reported by hackalog.instrumentation.
+"""
+import gzip
+import re
+import time
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from hackalog.instrumentation import current_metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def parse_accept_encoding(header):
+    """
+    The quality of every coding of an Accept-Encoding header, e.g.
+    {'gzip': 1.0, 'br': 0.5} for 'gzip, br;q=0.5'.
+    """
+    qualities = {}
+    for coding in header.split(','):
+        match = CODING.match(coding)
+        if match is None:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        qualities[match.group(1).lower()] = quality
+    return qualities
+
+
+def available_encodings():
+    return [encoding for encoding in settings.COMPRESSION['ENCODINGS']
+            if encoding != 'br' or brotli is not None]
+
+
+def negotiate(header):
+    """
+    The encoding of available_encodings() to use for an Accept-Encoding
+    header, None if the client accepts none of them.
+    """
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION['BROTLI_QUALITY'])
+    return gzip.compress(content, compresslevel=settings.COMPRESSION['GZIP_LEVEL'], mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+    def process_response(self, request, response):
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < settings.COMPRESSION['MIN_SIZE']):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        started = time.perf_counter()
+        content = compress(response.content, encoding)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.compress_time += time.perf_counter() - started
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # The compressed content differs from the one a strong ETag names
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,257 @@
+"""
+Per-request instrumentation.
+
+For a sample of requests (settings.INSTRUMENTATION['SAMPLE_RATE']) served by
+views of INSTRUMENTATION['VIEW_MODULES'], InstrumentationMiddleware records:
+
+* the number of SQL queries and the time spent in them,
+* queries repeated within the request, by fingerprint (the SQL with
+  literals and IN lists collapsed), which points at N+1 patterns,
+* the time spent opening database connections, which persistent
+  connections (CONN_MAX_AGE) are meant to avoid,
+* the time the Timed serializers spent building the response data,
+  less the SQL queries they ran,
+* the time the Timed renderers spent rendering the response data and
+  hackalog.compression spent compressing it,
+* the total time and the size of the response, as sent.
+
+They are sent in a Server-Timing header and logged as one JSON object per
+request to the 'hackalog.instrumentation' logger. Requests outside the
+sample only pay for a context variable lookup per query.
+
+The measurements of a request are kept in a context variable, so they are
+also collected in ASGI mode, where the middleware runs in the event loop
+and Django runs the view in a thread of the request, with a copy of its
+context. The connections of that thread are instrumented when the
+request_started signal is sent from it.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.renderers import JSONRenderer
+from hackalog.renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+def fingerprint(sql):
+    """
+    `sql` with literals and placeholders replaced by ?, and IN lists of any
+    length collapsed, so that queries differing only in values match.
+    """
+    sql = LITERALS.sub('?', sql).replace('%s', '?')
+    return IN_LISTS.sub('(...)', sql)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_time = 0
+        self.connections = 0
+        self.connect_time = 0
+        self.serialize_time = 0
+        self.serializing = False
+        self.render_time = 0
+        self.compress_time = 0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        return [{'sql': sql, 'count': count}
+                for sql, count in self.queries.most_common() if count > 1]
+
+    def server_timing(self, total_time):
+        timings = [
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ]
+        if self.compress_time:
+            timings.insert(-1, f'compress;dur={self.compress_time * 1000:.1f}')
+        duplicates = sum(count - 1 for count in self.queries.values() if count > 1)
+        if duplicates:
+            timings.insert(1, f'db-duplicates;desc="{duplicates} repeated queries"')
+        if self.connections:
+            timings.insert(0, f'db-connect;dur={self.connect_time * 1000:.1f};'
+                              f'desc="{self.connections} new"')
+        return ', '.join(timings)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.queries[fingerprint(sql)] += 1
+
+
+def instrument_connection(connection):
+    """
+    Adds, once per connection object, an execute wrapper recording queries
+    and a wrapper of connect() recording connection setup time.
+    """
+    if getattr(connection, 'is_instrumented', False):
+        return
+    connection.execute_wrappers.append(record_query)
+    connect = connection.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            connect()
+        finally:
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.connections += 1
+                metrics.connect_time += time.perf_counter() - started
+
+    connection.connect = timed_connect
+    connection.is_instrumented = True
+
+
+def instrument_connections():
+    """
+    Instruments the connection objects of the current thread.
+    """
+    for alias in connections:
+        instrument_connection(connections[alias])
+
+
+@receiver(request_started)
+def instrument_request_connections(**kwargs):
+    instrument_connections()
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding the time spent in to_representation to the
+    metrics of the request, less the time of the queries it ran, which are
+    counted as SQL time. Only the outermost Timed serializer is timed, and
+    the serializers of a list are timed one object at a time, after the
+    list is fetched.
+    """
+
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started, sql_time = time.perf_counter(), metrics.sql_time
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            metrics.serialize_time += (time.perf_counter() - started
+                                       - (metrics.sql_time - sql_time))
+
+
+class TimedRendererMixin:
+    """
+    Renderer mixin adding the rendering time to the metrics of the request.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+
+
+class TimedJSONRenderer(TimedRendererMixin, JSONRenderer):
+    pass
+
+
+class TimedORJSONRenderer(TimedRendererMixin, ORJSONRenderer):
+    pass
+
+
+def start_request():
+    if random.random() >= settings.INSTRUMENTATION['SAMPLE_RATE']:
+        return None, None
+    instrument_connections()
+    metrics = RequestMetrics()
+    return metrics, current_metrics.set(metrics)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    name = match._func_path
+    if name.startswith(tuple(module + '.' for module in
+                             settings.INSTRUMENTATION['VIEW_MODULES'])):
+        return name
+    return None
+
+
+def finish_request(request, response, metrics, token, started):
+    if metrics is None:
+        return response
+    current_metrics.reset(token)
+    view = view_name(request)
+    if view is None:
+        return response
+    total_time = time.perf_counter() - started
+    if settings.INSTRUMENTATION['SERVER_TIMING']:
+        response['Server-Timing'] = metrics.server_timing(total_time)
+    logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': response.status_code,
+        'duration_ms': round(total_time * 1000, 2),
+        'queries': metrics.query_count,
+        'sql_ms': round(metrics.sql_time * 1000, 2),
+        'duplicate_queries': metrics.duplicates(),
+        'db_connections': metrics.connections,
+        'db_connect_ms': round(metrics.connect_time * 1000, 2),
+        'serialize_ms': round(metrics.serialize_time * 1000, 2),
+        'render_ms': round(metrics.render_time * 1000, 2),
+        'compress_ms': round(metrics.compress_time * 1000, 2),
+        'response_bytes': len(response.content) if not response.streaming else None,
+    }))
+    return response
+
+
+@sync_and_async_middleware
+def InstrumentationMiddleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            metrics, token = start_request()
+            response = await get_response(request)
+            return finish_request(request, response, metrics, token, started)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            metrics, token = start_request()
+            response = get_response(request)
+            return finish_request(request, response, metrics, token, started)
+    return middleware
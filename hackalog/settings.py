@@ -10,9 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
-import firebase_admin
 import os
-import pyAesCrypt
+import sys
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'authentication.User'
 
 MIDDLEWARE = [
+    'hackalog.instrumentation.InstrumentationMiddleware',
+    'hackalog.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,7 +57,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django.middleware.common.CommonMiddleware'
 ]
 
 ROOT_URLCONF = 'hackalog.urls'
@@ -63,8 +64,89 @@ ROOT_URLCONF = 'hackalog.urls'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-    )
+        'authentication.backends.CachedTokenAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    # hackalog.instrumentation.TimedJSONRenderer and
+    # rest_framework.parsers.JSONParser use the json module instead of orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'hackalog.instrumentation.TimedORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'hackalog.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 50)),
+    # Only views with a throttle_scope are throttled (see hackalog.throttling)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'hackalog.throttling.UserRateThrottle',
+        'hackalog.throttling.IPRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'join_user': os.environ.get('THROTTLE_JOIN_USER', '10/min'),
+        'join_ip': os.environ.get('THROTTLE_JOIN_IP', '120/min'),
+    },
+    # Number of proxies in front of the app, whose X-Forwarded-For entries
+    # are skipped to find the client address. With 0 the client address is
+    # REMOTE_ADDR. Unset, client addresses are unknown and the '_ip' rates
+    # are not applied (see hackalog.throttling).
+    'NUM_PROXIES': (int(os.environ['NUM_PROXIES'])
+                    if os.environ.get('NUM_PROXIES') else None),
+}
+
+# Request counters of hackalog.throttling. SHARED_CACHE is the alias in
+# CACHES they are kept in, the counters are local to each process without it
+# or when it fails.
+THROTTLING = {
+    'SHARED_CACHE': os.environ.get('THROTTLE_SHARED_CACHE', 'default') or None,
+    'LOCAL_MAX_SIZE': int(os.environ.get('THROTTLE_LOCAL_MAX_SIZE', 10000)),
+}
+
+# Request instrumentation (see hackalog.instrumentation). SAMPLE_RATE is the
+# fraction of requests measured, from 0 to 1.
+INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.1)),
+    'SERVER_TIMING': os.environ.get('INSTRUMENTATION_SERVER_TIMING', 'true').lower() == 'true',
+    'VIEW_MODULES': ('core.views', 'authentication.views'),
+}
+
+# Response compression (see hackalog.compression). ENCODINGS are in order
+# of preference, 'br' is skipped without the brotli package.
+COMPRESSION = {
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    'ENCODINGS': tuple(os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',')),
+    'GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5)),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'hackalog.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Largest page a client can request with ?page_size=
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+
+# Token -> user cache of authentication.backends.CachedTokenAuthentication.
+# SHARED_CACHE is an optional alias in CACHES shared by all processes.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'LOCAL_TTL': int(os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 30)),
+    'SHARED_CACHE': os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None,
+    'SHARED_TTL': int(os.environ.get('TOKEN_AUTH_CACHE_SHARED_TTL', 300)),
 }
 
 
@@ -102,14 +184,87 @@ WSGI_APPLICATION = 'hackalog.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'railway',
-        'USER': 'postgres',
-        'PASSWORD': 'mPkLyxX3TD9Lbst3u0WH',
-        'HOST': 'containers-us-west-136.railway.app',
-        'PORT': '7881',
+        'NAME': os.environ.get('DB_NAME', 'railway'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Seconds a connection is reused across requests instead of opening a
+        # new TLS connection per request: 0 closes it after every request,
+        # "none" keeps it open indefinitely. In ASGI mode every request runs
+        # in a new thread with a connection of its own, which is not reused.
+        'CONN_MAX_AGE': (None if os.environ.get('DB_CONN_MAX_AGE', '').lower() == 'none'
+                         else int(os.environ.get('DB_CONN_MAX_AGE',
+                                                 0 if os.environ.get('SERVER_MODE') == 'asgi' else 60))),
+        # Check a reused connection before its first query in a request, so a
+        # connection dropped by the server is replaced rather than failing
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        },
+    }
+}
+
+# Behind PgBouncer in transaction pooling mode, server-side cursors (used by
+# QuerySet.iterator()) cannot span the pooled transactions.
+if os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Firebase ID token verification (see authentication.firebase).
+# The project id is read from the service account unless given here.
+FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID')
+FIREBASE_KEY_SOURCE = 'authentication.firebase.GoogleCertificateSource'
+# Service account credentials encrypted with encrypt_credentials.py. They are
+# decrypted in memory when the Firebase Admin SDK is first used. The size
+# defaults to the size of the file.
+FIREBASE_CREDENTIALS_FILE = os.path.join(BASE_DIR, 'firebase_admin.aes')
+FIREBASE_DECRYPT_KEY = os.environ.get('FIREBASE_DECRYPT_KEY')
+FIREBASE_DECRYPT_SIZE = os.environ.get('FIREBASE_DECRYPT_SIZE')
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) in
+# production so that invalidations reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# Seconds a public hackathon list or detail response is cached for
+HACKATHON_CACHE_TIMEOUT = int(os.environ.get('HACKATHON_CACHE_TIMEOUT', 300))
+
+# Public URL of the API, which the links in the snapshots of completed
+# hackathons point to (see core.snapshots). Snapshots are off without it.
+SNAPSHOT_BASE_URL = os.environ.get('SNAPSHOT_BASE_URL')
+# Snapshots stored per hackathon on request, beyond which pages are served
+# live
+SNAPSHOT_MAX_PER_HACKATHON = int(os.environ.get('SNAPSHOT_MAX_PER_HACKATHON', 200))
+
+# The test suite and benchmarks run against a local-memory cache and a local
+# SQLite database instead of Railway, or with TEST_DATABASE=postgresql against
+# the Postgres server given by the DB_* variables (e.g. a local one).
+if len(sys.argv) > 1 and (sys.argv[1] == 'test' or sys.argv[1].startswith('benchmark')):
+    if os.environ.get('TEST_DATABASE', 'sqlite') == 'sqlite':
+        DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+    LOGGING['loggers']['hackalog.instrumentation']['level'] = 'WARNING'
+    # Tests and benchmarks make many requests from one address, tests of
+    # throttling set their own rates
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {}
+    SNAPSHOT_BASE_URL = SNAPSHOT_BASE_URL or 'http://testserver'
+else:
+    missing = [name for name in ('DB_HOST', 'DB_PASSWORD') if not os.environ.get(name)]
+    if missing:
+        raise ImproperlyConfigured(
+            f'Set {" and ".join(missing)} to the connection details of the database.')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -150,18 +305,3 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 CORS_ALLOW_ALL_ORIGINS = True
-
-# Firebase Credentials
-with open('firebase_admin.aes', 'rb') as encrypted_file:
-    with open('firebase_admin.json', 'wb') as decrypted_file:
-        pyAesCrypt.decryptStream(
-            encrypted_file,
-            decrypted_file,
-            os.environ.get('FIREBASE_DECRYPT_KEY'),
-            64*1024,
-            int(os.environ.get('FIREBASE_DECRYPT_SIZE'))
-        )
-
-credentials = firebase_admin.credentials.Certificate(
-    os.path.join(BASE_DIR, 'firebase_admin.json'))
-firebase_admin.initialize_app(credentials)
@@ -0,0 +1,150 @@
+"""
+Rate limiting of bursty endpoints.
+
+Views opt in with a `throttle_scope`. UserRateThrottle then limits each
+authenticated user to REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] of
+'<scope>_user', and IPRateThrottle each client address to '<scope>_ip'. A
+scope without a rate is not limited. Client addresses are only known when
+REST_FRAMEWORK['NUM_PROXIES'] is set: behind a proxy, REMOTE_ADDR is the
+address of the proxy for every client.
+
+Requests are counted in fixed windows of the rate's period, with one atomic
+increment of a counter in the cache THROTTLING['SHARED_CACHE'], so every
+process shares the counts. When no shared cache is set, or it fails, the
+requests are counted in memory, per process.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'throttle:'
+
+
+class LocalCounters:
+    """
+    Thread-safe counters expiring `timeout` seconds after they were created,
+    at most `max_size` of them.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self.lock:
+            count, expires = self.counts.get(key, (0, 0))
+            if expires <= now:
+                self.counts.pop(key, None)
+                count, expires = 0, now + timeout
+            self.counts[key] = (count + 1, expires)
+            if len(self.counts) > self.max_size:
+                self.prune(now)
+            return count + 1
+
+    def prune(self, now):
+        for key in [key for key, (_, expires) in self.counts.items() if expires <= now]:
+            del self.counts[key]
+        # Oldest counters first
+        while len(self.counts) > self.max_size:
+            del self.counts[next(iter(self.counts))]
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+local_counters = LocalCounters(settings.THROTTLING['LOCAL_MAX_SIZE'])
+
+
+def get_shared_cache():
+    alias = settings.THROTTLING['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def incr_shared(cache, key, timeout):
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The counter expired since add()
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def incr(key, timeout):
+    """
+    Increments the counter `key`, created for `timeout` seconds if missing,
+    and returns its new value.
+    """
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        try:
+            return incr_shared(shared_cache, KEY_PREFIX + key, timeout)
+        except Exception:
+            logger.warning('Could not count the request in the shared cache, '
+                           'counting it locally', exc_info=True)
+    return local_counters.incr(key, timeout)
+
+
+class WindowRateThrottle(SimpleRateThrottle):
+    """
+    Throttles the requests of `throttle_scope` views to the rate of
+    '<throttle_scope>_<kind>' per identity.
+    """
+    kind = None
+    timer = time.time
+
+    def __init__(self):
+        # The rate depends on the view
+        pass
+
+    def get_identity(self, request):
+        """
+        The identity requests are counted by, None to not throttle.
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        self.scope = f'{scope}_{self.kind}'
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        identity = self.get_identity(request)
+        if self.rate is None or identity is None:
+            return True
+
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        now = self.timer()
+        window = int(now // self.duration)
+        self.remaining = (window + 1) * self.duration - now
+        count = incr(f'{self.scope}:{identity}:{window}', self.duration + 1)
+        return count <= self.num_requests
+
+    def wait(self):
+        return self.remaining
+
+
+class UserRateThrottle(WindowRateThrottle):
+    kind = 'user'
+
+    def get_identity(self, request):
+        return request.user.pk if request.user and request.user.is_authenticated else None
+
+
+class IPRateThrottle(WindowRateThrottle):
+    kind = 'ip'
+
+    def get_identity(self, request):
+        if api_settings.NUM_PROXIES is None:
+            return None
+        return self.get_ident(request)